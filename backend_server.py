@@ -3,7 +3,7 @@ YOLOv12 Lung Cancer Detection Backend Server
 FastAPI implementation with actual YOLO model integration using best.pt
 
 Installation:
-pip install fastapi uvicorn python-multipart ultralytics opencv-python pillow numpy pydicom
+pip install fastapi uvicorn python-multipart ultralytics opencv-python pillow numpy pydicom nibabel
 
 Run:
 uvicorn backend_server:app --host 0.0.0.0 --port 8000 --reload
@@ -12,19 +12,43 @@ Or use the startup script:
 python start_backend.py
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import cv2
 import numpy as np
 from PIL import Image
+import abc
 import io
+import json
+import math
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, List
 import os
 import tempfile
 import traceback
+import asyncio
+import contextvars
+import functools
+import gzip
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import heapq
+import hashlib
+import hmac
+import itertools
+import shutil
+import sqlite3
+import zipfile
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextlib
+from contextlib import asynccontextmanager, AsyncExitStack
 
 # Import YOLO from ultralytics
 from ultralytics import YOLO
@@ -37,12 +61,109 @@ except ImportError:
     DICOM_SUPPORT = False
     print("Warning: pydicom not installed. DICOM file support disabled.")
 
+# Try to import nibabel for NIfTI support
+try:
+    import nibabel as nib
+    NIFTI_SUPPORT = True
+except ImportError:
+    NIFTI_SUPPORT = False
+    print("Warning: nibabel not installed. NIfTI file support disabled.")
+
 app = FastAPI(
     title="LungEvity YOLOv12 API",
     version="1.0.0",
     description="Lung cancer detection API using YOLOv12 model"
 )
 
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversized upload bodies before they are read
+
+    Uploads whose Content-Length is over the endpoint's limit get a 413 without
+    reading the body. Bodies without a (truthful) Content-Length are counted as
+    they stream in and cut off as soon as they cross the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            limit = upload_body_limit(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        detail = f"Request body exceeds {limit // (1024 * 1024)}MB limit"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised while the route parses the form, so it becomes the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class RequestMetricsMiddleware:
+    """
+    Count requests by endpoint and status for /metrics
+
+    Pipeline stage durations recorded while a request is handled are returned
+    in its Server-Timing header, together with the total so far.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = {}
+        token = request_timings.set(timings)
+        profile = flight_recorder.begin(scope["method"], scope["path"])
+        profile_token = request_profile.set(profile) if profile is not None else None
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get("headers", [])) + [(b"server-timing", ", ".join(entries).encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_timings.reset(token)
+            # Route templates keep label cardinality bounded
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            metrics.observe_request(endpoint, scope["method"], status, elapsed)
+            if profile is not None:
+                request_profile.reset(profile_token)
+                flight_recorder.finish(profile, endpoint, status, elapsed, timings)
+
+
+# Registered before CORS so that upload rejections still carry CORS headers
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -57,298 +178,3027 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so every response (including CORS preflights and rejections) is counted
+app.add_middleware(RequestMetricsMiddleware)
+
 # Global variables
 MODEL_PATH = "best.pt"
 model = None
 MODEL_LOADED = False
+MODEL_VERSION = None  # Short SHA-256 of the loaded weights
+MODEL_NAME = None  # Registry version (or weights file name) of the loaded model
+MODEL_STATE = "not_started"  # not_started, loading, warming_up, ready or failed
+CONF_THRESHOLD = 0.25  # 25% confidence threshold
+
+# Versioned weights live in MODEL_REGISTRY_DIR as <version>.pt. ACTIVE_MODEL
+# picks the version loaded at startup (best.pt when unset); admins can load,
+# warm up and swap in another version at runtime
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "models")
+ACTIVE_MODEL = os.environ.get("ACTIVE_MODEL")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")  # Admin endpoints are disabled unless this is set
+WORKER_PROCESSES = 1  # Set by start_backend.py when it pre-forks several workers
+
+# Inference backend: "pytorch" runs best.pt directly, "onnx" (ONNX Runtime) and
+# "openvino" run an export of it, cached under EXPORT_CACHE_DIR by weights hash
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "pytorch").lower()
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR", "model_exports")
+EXPORT_IMGSZ = int(os.environ.get("EXPORT_IMGSZ", 640))
+EXPORT_ARTIFACT_NAMES = {"onnx": "{stem}.onnx", "openvino": "{stem}_openvino_model"}
+
+# "onnx-int8" quantizes the ONNX export with CT slices from QUANT_CALIBRATION_DIR
+# and is only used if its detections on QUANT_HOLDOUT_DIR agree with the FP32
+# model to within QUANT_MAX_ACCURACY_DROP
+QUANT_CALIBRATION_DIR = os.environ.get("QUANT_CALIBRATION_DIR", "calibration")
+QUANT_CALIBRATION_MAX_IMAGES = int(os.environ.get("QUANT_CALIBRATION_MAX_IMAGES", 200))
+QUANT_HOLDOUT_DIR = os.environ.get("QUANT_HOLDOUT_DIR", "calibration_holdout")
+QUANT_MAX_ACCURACY_DROP = float(os.environ.get("QUANT_MAX_ACCURACY_DROP", 0.02))
+QUANT_MATCH_IOU = float(os.environ.get("QUANT_MATCH_IOU", 0.5))
+
+# "stub" needs no weights: seeded fake detections plus simulated model cost,
+# for load tests and profiling where best.pt is not available
+STUB_DETECTIONS = int(os.environ.get("STUB_DETECTIONS", 2))  # Boxes per image
+STUB_COMPUTE_MS = float(os.environ.get("STUB_COMPUTE_MS", 25))  # CPU time per image
+STUB_SEED = int(os.environ.get("STUB_SEED", 0))
+
+# Micro-batching configuration (tunable via environment variables)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 10))
+
+# Number of slices sent to the model per call in /api/v1/scan/batch-analyze
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 16))
+
+# The model is loaded in the background at startup and warmed up with
+# WARMUP_RUNS inferences on synthetic 640x640 inputs at each batch size we
+# serve before it takes requests (WARMUP_RUNS=0 skips warm-up)
+WARMUP_RUNS = int(os.environ.get("WARMUP_RUNS", 2))
+WARMUP_BATCH_SIZES = sorted({
+    int(size) for size in
+    os.environ.get("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE},{BATCH_CHUNK_SIZE}").split(",")
+    if size.strip()
+})
+warmup_report = {}  # Batch size -> warm-up latencies in ms
+
+# CPU-bound stages (decode, inference, annotation) run in a bounded thread pool
+# so the event loop stays responsive; requests beyond the queue limit get a 503
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 2))
+INFERENCE_QUEUE_LIMIT = int(os.environ.get("INFERENCE_QUEUE_LIMIT", 32))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", 5))
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_WORKERS,
+    thread_name_prefix="inference"
+)
+inference_inflight = 0  # Only touched from the event loop thread
+
+# Short blocking I/O (upload hashing, job queue storage) runs in a small pool of
+# its own, so it neither stalls the event loop nor takes capacity from the
+# inference pool - even for requests that are then rejected with a 503
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 4))
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
 
 # Storage for scans (in production, use a database like PostgreSQL or MongoDB)
 scans_db = {}
-scan_images = {}  # Store processed images
+
+# Decoded scan images are kept in memory up to SCAN_STORE_MAX_BYTES; colder
+# images spill to SCAN_SPILL_DIR (a temporary directory by default)
+SCAN_STORE_MAX_BYTES = int(os.environ.get("SCAN_STORE_MAX_BYTES", 512 * 1024 * 1024))
+SCAN_SPILL_MAX_BYTES = int(os.environ.get("SCAN_SPILL_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+SCAN_SPILL_DIR = os.environ.get("SCAN_SPILL_DIR")
+
+# Annotated renders are cached per scan and render options, and by default
+# rendered in the background right after inference
+ANNOTATED_CACHE_MAX_BYTES = int(os.environ.get("ANNOTATED_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+ANNOTATE_EAGERLY = os.environ.get("ANNOTATE_EAGERLY", "true").lower() in ("1", "true", "yes")
+ANNOTATE_QUEUE_LIMIT = int(os.environ.get("ANNOTATE_QUEUE_LIMIT", 4))  # Pending eager renders; more are dropped
+ANNOTATION_RENDER_VERSION = 1  # Bump when create_annotated_image output changes
+IMAGE_CACHE_CONTROL = "private, max-age=86400"
 
 # Class names from the training
 CANCER_CLASSES = ["adenocarcinoma", "normal", "squamous_cell_carcinoma"]
 
+# Upload validation
+ALLOWED_FORMATS = ['.dcm', '.dicom', '.nii', '.nii.gz', '.jpg', '.jpeg', '.png']
+NIFTI_FORMATS = ['.nii', '.nii.gz']
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024  # 100MB
 
-def load_model():
-    """Load the YOLOv12 model from best.pt"""
-    global model, MODEL_LOADED
-    try:
-        if not os.path.exists(MODEL_PATH):
-            print(f"Error: Model file '{MODEL_PATH}' not found in current directory")
-            print(f"Current directory: {os.getcwd()}")
-            print("Please ensure best.pt is in the same directory as backend_server.py")
-            return False
+# Uploads are hashed and size-checked in UPLOAD_CHUNK_SIZE chunks
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024  # Form fields and part headers on top of the files
 
-        print(f"Loading YOLO model from {MODEL_PATH}...")
-        model = YOLO(MODEL_PATH)
-        MODEL_LOADED = True
-        print(f"Model loaded successfully!")
-        print(f"Model classes: {model.names}")
-        return True
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        traceback.print_exc()
-        MODEL_LOADED = False
-        return False
+# DICOM display windows as (width, level) in Hounsfield units. "minmax"
+# stretches each slice to its own range; DICOM_WINDOW sets the default
+DICOM_WINDOW_PRESETS = {
+    "lung": (1500, -600),
+    "mediastinal": (350, 50),
+}
+DEFAULT_DICOM_WINDOW = os.environ.get("DICOM_WINDOW", "minmax")
 
+# Series uploads to /api/v1/scan/volume-analyze (zip archives or multipart)
+VOLUME_FORMATS = ['.dcm', '.dicom', '.zip', '', *NIFTI_FORMATS]
+MAX_VOLUME_SIZE = int(os.environ.get("MAX_VOLUME_SIZE", 1024 * 1024 * 1024))
 
-def read_dicom_image(file_bytes: bytes) -> np.ndarray:
-    """
-    Read a DICOM image and convert to RGB format
+# Request body limits enforced by UploadSizeLimitMiddleware, per upload endpoint
+UPLOAD_BODY_LIMITS = {
+    "/api/v1/scan/analyze": MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD_BYTES,
+    "/api/v1/jobs": MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD_BYTES,
+    "/api/v1/scan/batch-analyze": MAX_VOLUME_SIZE + MULTIPART_OVERHEAD_BYTES,
+    "/api/v1/scan/volume-analyze": MAX_VOLUME_SIZE + MULTIPART_OVERHEAD_BYTES,
+}
 
-    Args:
-        file_bytes: DICOM file bytes
+# Asynchronous job queue configuration
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "memory")  # "memory" or "sqlite"
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", 256))
+JOB_MAX_WAIT_SECONDS = 60  # Upper bound for long-polling a job
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 3600))  # Finished jobs are then removed
+JOB_PURGE_INTERVAL_SECONDS = 60
 
-    Returns:
-        Image in RGB format as numpy array
+# Inference result cache keyed by upload hash, model version and parameters
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")  # Optional on-disk tier
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Latency histogram buckets (seconds) for /metrics
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PIPELINE_STAGES = ("upload_read", "read_image", "inference", "annotate", "encode")
+
+# Sampling profiler / slow-request flight recorder (can be reconfigured via the admin API)
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_SAMPLE_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", "0.01"))  # Fraction of requests kept
+PROFILER_SLOW_MS = float(os.environ.get("PROFILER_SLOW_MS", "0"))  # Also keep requests slower than this; 0 = off
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", "5"))
+FLIGHT_RECORDER_SIZE = int(os.environ.get("FLIGHT_RECORDER_SIZE", 20))  # Slowest requests kept
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus data model"""
+
+    def __init__(self, buckets: tuple = METRICS_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def render(self, name: str, labels: str) -> List[str]:
+        separator = "," if labels else ""
+        lines = [
+            f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms and request counters exposed at /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {stage: Histogram() for stage in PIPELINE_STAGES}
+        self._requests = Counter()  # (endpoint, method, status) -> count
+        self._request_latency = {}  # endpoint -> Histogram
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self._stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float):
+        with self._lock:
+            self._requests[(endpoint, method, status)] += 1
+            self._request_latency.setdefault(endpoint, Histogram()).observe(seconds)
+
+    def render(self, gauges: dict) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            "# HELP lungevity_stage_duration_seconds Time spent in each scan pipeline stage",
+            "# TYPE lungevity_stage_duration_seconds histogram"
+        ]
+        with self._lock:
+            for stage, histogram in self._stages.items():
+                lines += histogram.render("lungevity_stage_duration_seconds", f'stage="{stage}"')
+
+            lines += [
+                "# HELP lungevity_http_requests_total HTTP requests by endpoint, method and status",
+                "# TYPE lungevity_http_requests_total counter"
+            ]
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'lungevity_http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+
+            lines += [
+                "# HELP lungevity_http_request_duration_seconds HTTP request latency by endpoint",
+                "# TYPE lungevity_http_request_duration_seconds histogram"
+            ]
+            for endpoint, histogram in sorted(self._request_latency.items()):
+                lines += histogram.render("lungevity_http_request_duration_seconds", f'endpoint="{endpoint}"')
+
+        for name, (help_text, value) in gauges.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Stage durations of the current request, reported in its Server-Timing header
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float, timings: Optional[dict] = None):
+    """Add a stage duration to /metrics and to the request's Server-Timing breakdown"""
+    metrics.observe_stage(stage, seconds)
+    timings = timings if timings is not None else request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def timed_stage(stage: str):
+    """Decorator recording a function's duration (monotonic clock) as a pipeline stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class RequestProfile:
+    """Stack samples and details of one profiled request"""
+
+    def __init__(self, method: str, path: str, sampled: bool):
+        self.method = method
+        self.path = path
+        self.sampled = sampled  # Chosen by sample rate rather than only watched for slowness
+        self.started_at = datetime.utcnow().isoformat()
+        self.threads = set()  # Idents of threads currently working for the request
+        self.stacks = Counter()  # Collapsed stack -> sample count (guarded by the recorder lock)
+        self.images = []
+        self.detections = 0
+
+
+class FlightRecorder:
     """
-    if not DICOM_SUPPORT:
-        raise HTTPException(
-            status_code=400,
-            detail="DICOM support not available. Please install pydicom."
-        )
+    Opt-in sampling profiler keeping the slowest recent requests
 
-    try:
-        # Read DICOM file from bytes
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.dcm') as tmp_file:
-            tmp_file.write(file_bytes)
-            tmp_path = tmp_file.name
+    A request is profiled when it is picked at sample_rate, or always while
+    slow_ms is set (it is only kept if it turns out slower than that). A
+    sampler thread snapshots the stacks of the pool and batcher threads
+    working for profiled requests every interval_ms. Only the slowest
+    max_entries requests are kept. When disabled, the per-request cost is a
+    single attribute check.
+    """
 
-        ds = pydicom.dcmread(tmp_path)
-        img = ds.pixel_array
+    def __init__(self, enabled: bool, sample_rate: float, slow_ms: float,
+                 interval_ms: float, max_entries: int):
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval_ms = max(1.0, interval_ms)
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._active = set()
+        self._entries = []  # Min-heap of (seconds, seq, entry), so the fastest is evicted first
+        self._seq = itertools.count()
+        self._samples = 0
+        self._thread = None
+        if enabled:
+            self.configure(enabled=True)
 
-        # Clean up temp file
-        os.unlink(tmp_path)
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                  slow_ms: Optional[float] = None, clear: bool = False):
+        """Change settings; enabling starts the sampler thread"""
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = min(1.0, max(0.0, sample_rate))
+            if slow_ms is not None:
+                self.slow_ms = max(0.0, slow_ms)
+            if clear:
+                self._entries = []
+            if enabled is not None:
+                self.enabled = enabled
+            if self.enabled and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._sample_loop, name="flight-recorder", daemon=True)
+                self._thread.start()
 
-        # Normalize to 8-bit range (0-255)
-        img = ((img - img.min()) / (img.max() - img.min()) * 255).astype(np.uint8)
+    def begin(self, method: str, path: str) -> Optional[RequestProfile]:
+        """Decide whether to profile a request; None when it is not profiled"""
+        if not self.enabled:
+            return None
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_ms:
+            return None
+        profile = RequestProfile(method, path, sampled)
+        with self._lock:
+            self._active.add(profile)
+        return profile
 
-        # Convert to RGB (DICOM images are often grayscale)
-        if len(img.shape) == 2:
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-        else:
-            img_rgb = img
+    def finish(self, profile: RequestProfile, endpoint: str, status: int, seconds: float, timings: dict):
+        """Stop sampling a request and keep it if it was sampled or slow"""
+        with self._lock:
+            self._active.discard(profile)
+            stacks = profile.stacks.copy()
+        if not profile.sampled and seconds * 1000 < self.slow_ms:
+            return
 
-        return img_rgb
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading DICOM file: {str(e)}")
+        entry = {
+            "method": profile.method,
+            "path": profile.path,
+            "endpoint": endpoint,
+            "status": status,
+            "startedAt": profile.started_at,
+            "durationMs": round(seconds * 1000, 2),
+            "stagesMs": {stage: round(value * 1000, 2) for stage, value in timings.items()},
+            "images": profile.images,
+            "detections": profile.detections,
+            "trigger": "sampled" if profile.sampled else "slow",
+            "samples": sum(stacks.values()),
+            "stacks": dict(stacks.most_common())
+        }
+        with self._lock:
+            heapq.heappush(self._entries, (seconds, next(self._seq), entry))
+            if len(self._entries) > self.max_entries:
+                heapq.heappop(self._entries)
+
+    @contextlib.contextmanager
+    def attach(self, profiles: list):
+        """Attribute the current thread's stack samples to profiles while the block runs"""
+        if not profiles:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            for profile in profiles:
+                profile.threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for profile in profiles:
+                    profile.threads.discard(ident)
+
+    def _sample_loop(self):
+        while self.enabled:
+            time.sleep(self.interval_ms / 1000.0)
+            with self._lock:
+                targets = [(profile, list(profile.threads)) for profile in self._active if profile.threads]
+            if not targets:
+                continue
+
+            frames = sys._current_frames()
+            collapsed = {}
+            for _, idents in targets:
+                for ident in idents:
+                    if ident not in collapsed:
+                        frame = frames.get(ident)
+                        collapsed[ident] = collapse_stack(frame) if frame is not None else None
+            del frames
+
+            with self._lock:
+                for profile, idents in targets:
+                    for ident in idents:
+                        if collapsed[ident]:
+                            profile.stacks[collapsed[ident]] += 1
+                self._samples += 1
+
+    def after_fork(self):
+        """
+        Reset the recorder in a forked child
+
+        Threads do not survive fork, so pre-forked workers start their own
+        sampler; the lock is replaced in case the parent's sampler held it.
+        """
+        self._lock = threading.Lock()
+        self._active = set()
+        self._entries = []
+        self._thread = None
+        if self.enabled:
+            self.configure()
+
+    def entries(self) -> List[dict]:
+        """Kept requests, slowest first"""
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._entries, reverse=True)]
+
+    def collapsed(self) -> str:
+        """Stacks of all kept requests in collapsed format, rooted at their endpoint"""
+        totals = Counter()
+        for entry in self.entries():
+            root = f"{entry['method']} {entry['endpoint']}"
+            for stack, count in entry["stacks"].items():
+                totals[f"{root};{stack}"] += count
+        return "".join(f"{stack} {count}\n" for stack, count in totals.most_common())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sampleRate": self.sample_rate,
+                "slowMs": self.slow_ms,
+                "intervalMs": self.interval_ms,
+                "maxEntries": self.max_entries,
+                "entries": len(self._entries),
+                "activeRequests": len(self._active),
+                "sampleTicks": self._samples
+            }
 
 
-def read_image(file_bytes: bytes, filename: str) -> np.ndarray:
+def collapse_stack(frame) -> str:
+    """Format a frame's stack root-first as "file:function;file:function" """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+flight_recorder = FlightRecorder(PROFILER_ENABLED, PROFILER_SAMPLE_RATE, PROFILER_SLOW_MS,
+                                 PROFILER_INTERVAL_MS, FLIGHT_RECORDER_SIZE)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=flight_recorder.after_fork)
+
+# Flight-recorder profile of the current request, or None when it is not profiled
+request_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+def note_request(filename: Optional[str] = None, image: Optional[np.ndarray] = None,
+                 detections: Optional[int] = None):
+    """Add image and detection details to the current request's flight-recorder entry"""
+    profile = request_profile.get()
+    if profile is None:
+        return
+    if image is not None:
+        profile.images.append({
+            "format": scan_extension(filename) if filename else None,
+            "width": int(image.shape[1]),
+            "height": int(image.shape[0])
+        })
+    if detections is not None:
+        profile.detections += detections
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file in chunks without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_model(weights_path: str, weights_hash: str, export_format: str) -> str:
     """
-    Read image file (DICOM, JPEG, PNG) and convert to RGB
+    Export YOLO weights to an Ultralytics export format, once per weights hash
+
+    Exports are built in a staging directory and moved into
+    EXPORT_CACHE_DIR/<weights_hash>/imgsz<N>/ when complete, so an interrupted export
+    is never picked up.
 
     Args:
-        file_bytes: Image file bytes
-        filename: Original filename to determine format
+        weights_path: Path to the .pt weights
+        weights_hash: Version of the weights (cache key)
+        export_format: Ultralytics export format ("onnx", "openvino")
 
     Returns:
-        Image in RGB format as numpy array
+        Path to the exported model (file or directory)
     """
-    file_ext = os.path.splitext(filename)[1].lower()
+    export_dir = os.path.join(EXPORT_CACHE_DIR, weights_hash, f"imgsz{EXPORT_IMGSZ}")
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    # Ultralytics picks the runtime from these names, so they are kept as exported
+    artifact = os.path.join(export_dir, EXPORT_ARTIFACT_NAMES[export_format].format(stem=stem))
+    if os.path.exists(artifact):
+        return artifact
 
+    os.makedirs(export_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix="export_", dir=export_dir)
     try:
-        # Handle DICOM files
-        if file_ext in ['.dcm', '.dicom']:
-            return read_dicom_image(file_bytes)
+        staged_weights = os.path.join(staging, os.path.basename(weights_path))
+        shutil.copyfile(weights_path, staged_weights)
+        print(f"Exporting {weights_path} to {export_format} (one-time, cached in {export_dir})...")
+        # Dynamic axes so the batcher and chunked batch analysis can vary the batch size
+        exported = YOLO(staged_weights).export(format=export_format, imgsz=EXPORT_IMGSZ, dynamic=True)
+        os.replace(exported, artifact)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return artifact
 
-        # Handle standard image formats
-        nparr = np.frombuffer(file_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
-        if img is None:
-            raise ValueError(f"Could not decode image from {filename}")
+class InferenceBackend(abc.ABC):
+    """
+    Base class for inference backends
 
-        # Convert BGR to RGB
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        return img_rgb
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading image: {str(e)}")
+    predict returns, per image, the (xyxy, confidences, class_ids) arrays that
+    detections_from_arrays turns into the API detection structure, so the
+    response is the same whichever backend produced it.
+    """
 
+    name = None
+    requires_weights = True
 
-def get_risk_level(confidence: float, class_name: str) -> str:
+    def __init__(self, weights_path: str, weights_hash: str, model_name: Optional[str] = None):
+        self.weights_path = weights_path
+        self.weights_hash = weights_hash
+        self.model_name = model_name or os.path.basename(weights_path)
+        self.names = {}
+        self.lock = threading.Lock()  # Ultralytics predictors are not thread-safe
+
+    @property
+    def serving_name(self) -> str:
+        """Name of the backend actually producing detections"""
+        return self.name
+
+    @property
+    def cache_tag(self) -> str:
+        """Identifies the outputs of this backend in result cache keys"""
+        return self.serving_name
+
+    @abc.abstractmethod
+    def load(self):
+        """Load the model; called once before the backend serves"""
+
+    @abc.abstractmethod
+    def predict(self, images: List[np.ndarray], conf: float) -> List[tuple]:
+        """(xyxy, confidences, class_ids) arrays per image"""
+
+
+class UltralyticsBackend(InferenceBackend):
+    """Ultralytics YOLO running the .pt weights or an export of them"""
+
+    export_format = None  # Ultralytics export format run instead of the .pt weights
+
+    def artifact_path(self) -> str:
+        if self.export_format is None:
+            return self.weights_path
+        return export_model(self.weights_path, self.weights_hash, self.export_format)
+
+    def load(self):
+        self.model = YOLO(self.artifact_path(), task="detect")
+        self.names = self.model.names
+
+    def predict(self, images: List[np.ndarray], conf: float) -> List[tuple]:
+        return [_result_arrays(r) for r in self.model(images, conf=conf)]
+
+
+class PyTorchBackend(UltralyticsBackend):
+    """Ultralytics YOLO running the .pt weights with PyTorch"""
+
+    name = "pytorch"
+
+
+class OnnxRuntimeBackend(UltralyticsBackend):
+    """Ultralytics YOLO running an ONNX export on ONNX Runtime"""
+
+    name = "onnx"
+    export_format = "onnx"
+
+
+class OpenVINOBackend(UltralyticsBackend):
+    """Ultralytics YOLO running an OpenVINO IR export"""
+
+    name = "openvino"
+    export_format = "openvino"
+
+
+def list_scan_files(directory: str, limit: Optional[int] = None) -> List[str]:
+    """Sorted paths of the supported scan files in a directory"""
+    if not os.path.isdir(directory):
+        return []
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if scan_extension(name) in ALLOWED_FORMATS
+    )
+    return paths[:limit] if limit is not None else paths
+
+
+def letterbox(image: np.ndarray, size: int) -> np.ndarray:
+    """Resize keeping the aspect ratio and pad to size x size, as Ultralytics does before inference"""
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized_w, resized_h = round(width * scale), round(height * scale)
+    resized = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - resized_h) // 2, (size - resized_w) // 2
+    return cv2.copyMakeBorder(resized, top, size - resized_h - top, left, size - resized_w - left,
+                              cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def quantize_onnx_model(onnx_path: str, calibration_paths: List[str], output_path: str):
     """
-    Determine risk level based on confidence score and class
+    Post-training static INT8 quantization of an ONNX export with ONNX Runtime
 
-    Args:
-        confidence: Model confidence score (0-1)
-        class_name: Predicted class name
+    Convolution weights are quantized per channel and activations are
+    calibrated on the given CT slices, letterboxed to EXPORT_IMGSZ like at
+    inference time. Written to a temporary file and moved into place.
+    """
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
 
-    Returns:
-        Risk level: 'high', 'medium', 'low', or 'none'
+    input_name = InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class CalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(calibration_paths)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            if path is None:
+                return None
+            with open(path, "rb") as f:
+                image = letterbox(read_image(f.read(), path), EXPORT_IMGSZ)
+            # Ultralytics treats arrays as BGR and flips them, so feed what the model sees
+            tensor = image[..., ::-1].transpose(2, 0, 1)[np.newaxis].astype(np.float32) / 255.0
+            return {input_name: tensor}
+
+    tmp_path = output_path + ".tmp"
+    quantize_static(
+        onnx_path, tmp_path, CalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=["Conv"],
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8
+    )
+    os.replace(tmp_path, output_path)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes"""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def match_detections(reference: tuple, candidate: tuple, iou_threshold: float = QUANT_MATCH_IOU) -> tuple:
     """
-    # If normal, return none
-    if class_name == "normal":
-        return "none"
+    Greedily match candidate boxes to reference boxes by IoU
 
-    # For cancer classes, use confidence thresholds
-    if confidence >= 0.8:
-        return "high"
-    elif confidence >= 0.5:
-        return "medium"
-    elif confidence >= 0.3:
-        return "low"
-    else:
-        return "none"
+    Reference boxes are matched in descending confidence order, each to the
+    unmatched candidate box it overlaps most (at least iou_threshold).
 
+    Returns:
+        (matched boxes, matched boxes with the same class)
+    """
+    ref_xyxy, ref_conf, ref_cls = reference
+    cand_xyxy, _, cand_cls = candidate
+    if len(ref_conf) == 0 or len(cand_cls) == 0:
+        return 0, 0
 
-def generate_scan_id() -> str:
-    """Generate unique scan ID"""
-    return f"scan_{uuid.uuid4().hex[:12]}"
+    iou = box_iou(ref_xyxy, cand_xyxy)
+    used = np.zeros(len(cand_cls), dtype=bool)
+    matched = same_class = 0
+    for i in np.argsort(-ref_conf, kind="stable"):
+        overlapping = np.flatnonzero(~used & (iou[i] >= iou_threshold))
+        if len(overlapping) == 0:
+            continue
+        j = overlapping[np.argmax(iou[i, overlapping])]
+        used[j] = True
+        matched += 1
+        same_class += int(ref_cls[i] == cand_cls[j])
+    return matched, same_class
 
 
-def process_image_with_yolo(image: np.ndarray) -> dict:
+def compare_backends(reference: "InferenceBackend", candidate: "InferenceBackend", paths: List[str],
+                     window: str = DEFAULT_DICOM_WINDOW) -> dict:
     """
-    Process CT scan image with YOLOv12 model
+    Compare a candidate backend's detections and latency against a reference
 
-    Args:
-        image: Input image as numpy array (RGB)
+    Box agreement is the number of IoU-matched boxes with the same class over
+    the larger of the two box counts; top-class agreement is the share of
+    images whose topClass is the same. The accuracy drop is one minus the
+    lower of the two.
 
     Returns:
-        Dictionary with detection results
+        Report with agreement, accuracy drop, mean latencies and speedup
     """
-    global model, MODEL_LOADED
+    totals = Counter()
+    elapsed = {"reference": 0.0, "candidate": 0.0}
+    warmed_up = False
+    for path in paths:
+        with open(path, "rb") as f:
+            image = read_image(f.read(), path, window)
+        height, width = image.shape[:2]
 
-    if not MODEL_LOADED or model is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Model not loaded. Please check server logs."
+        if not warmed_up:
+            reference.predict([image], CONF_THRESHOLD)
+            candidate.predict([image], CONF_THRESHOLD)
+            warmed_up = True
+
+        outputs = {}
+        for label, backend in (("reference", reference), ("candidate", candidate)):
+            start = time.perf_counter()
+            outputs[label] = backend.predict([image], CONF_THRESHOLD)[0]
+            elapsed[label] += time.perf_counter() - start
+
+        matched, same_class = match_detections(outputs["reference"], outputs["candidate"])
+        totals["referenceBoxes"] += len(outputs["reference"][1])
+        totals["candidateBoxes"] += len(outputs["candidate"][1])
+        totals["matchedBoxes"] += matched
+        totals["sameClassBoxes"] += same_class
+        top_classes = {
+            detections_from_arrays(*outputs[label], reference.names, width, height)["topClass"]
+            for label in outputs
+        }
+        totals["topClassAgreements"] += int(len(top_classes) == 1)
+
+    box_total = max(totals["referenceBoxes"], totals["candidateBoxes"])
+    box_agreement = totals["sameClassBoxes"] / box_total if box_total else 1.0
+    top_class_agreement = totals["topClassAgreements"] / len(paths) if paths else 0.0
+    return {
+        "images": len(paths),
+        **totals,
+        "boxAgreement": round(box_agreement, 4),
+        "topClassAgreement": round(top_class_agreement, 4),
+        "accuracyDrop": round(1 - min(box_agreement, top_class_agreement), 4),
+        "referenceMs": round(elapsed["reference"] / len(paths) * 1000, 2) if paths else None,
+        "candidateMs": round(elapsed["candidate"] / len(paths) * 1000, 2) if paths else None,
+        "speedup": round(elapsed["reference"] / elapsed["candidate"], 2) if elapsed["candidate"] else None
+    }
+
+
+class OnnxInt8Backend(OnnxRuntimeBackend):
+    """
+    INT8 ONNX Runtime model, post-training quantized from the ONNX export
+
+    The quantized model is cached next to the export, keyed by the
+    calibration set. On load it is checked against the FP32 best.pt on the
+    held-out set; if detections drift by more than QUANT_MAX_ACCURACY_DROP
+    (or there is no held-out set) it is refused and the FP32 model is served.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, weights_path: str, weights_hash: str, model_name: Optional[str] = None):
+        super().__init__(weights_path, weights_hash, model_name)
+        self.quantized = False
+        self.accuracy_report = None
+        self.calibration_hash = None
+
+    @property
+    def serving_name(self) -> str:
+        return self.name if self.quantized else PyTorchBackend.name
+
+    @property
+    def cache_tag(self) -> str:
+        # INT8 outputs also depend on the calibration set
+        return f"{self.name}-{self.calibration_hash}" if self.quantized else self.serving_name
+
+    def artifact_path(self) -> str:
+        onnx_path = super().artifact_path()
+        calibration_paths = list_scan_files(QUANT_CALIBRATION_DIR, QUANT_CALIBRATION_MAX_IMAGES)
+        if not calibration_paths:
+            raise ValueError(f"No calibration images found in '{QUANT_CALIBRATION_DIR}'")
+
+        self.calibration_hash = hashlib.sha256(
+            "".join(file_sha256(path) for path in calibration_paths).encode()
+        ).hexdigest()[:12]
+        int8_path = f"{os.path.splitext(onnx_path)[0]}.int8-{self.calibration_hash}.onnx"
+        if not os.path.exists(int8_path):
+            print(f"Quantizing {onnx_path} to INT8 with {len(calibration_paths)} calibration slices...")
+            quantize_onnx_model(onnx_path, calibration_paths, int8_path)
+        return int8_path
+
+    def load_unchecked(self):
+        """Load the INT8 model without the accuracy gate"""
+        super().load()
+        self.quantized = True
+
+    def load(self):
+        self.load_unchecked()
+
+        reference = PyTorchBackend(self.weights_path, self.weights_hash)
+        reference.load()
+        holdout_paths = list_scan_files(QUANT_HOLDOUT_DIR)
+        self.accuracy_report = compare_backends(reference, self, holdout_paths)
+        self.accuracy_report.update(
+            tolerance=QUANT_MAX_ACCURACY_DROP,
+            passed=bool(holdout_paths) and self.accuracy_report["accuracyDrop"] <= QUANT_MAX_ACCURACY_DROP
         )
+        print(f"INT8 accuracy check: {self.accuracy_report}")
 
-    try:
-        # Run YOLO inference
-        results = model(image, conf=0.25)  # 25% confidence threshold
+        if not self.accuracy_report["passed"]:
+            reason = "no held-out images" if not holdout_paths else \
+                f"accuracy drop {self.accuracy_report['accuracyDrop']} > {QUANT_MAX_ACCURACY_DROP}"
+            print(f"Warning: refusing INT8 model ({reason}); serving the FP32 model instead")
+            self.model, self.names = reference.model, reference.names
+            self.quantized = False
+
+
+class StubBackend(InferenceBackend):
+    """
+    Deterministic stand-in for the model that needs no weights
+
+    Detections are seeded from STUB_SEED and a hash of the image, so the
+    same image always yields the same STUB_DETECTIONS boxes, however it is
+    batched. Each image also costs STUB_COMPUTE_MS of GIL-releasing OpenCV
+    work at the model input size, so pool and batcher contention behave
+    like real inference. Only meant for benchmarks and CI, never for diagnosis.
+    """
+
+    name = "stub"
+    requires_weights = False
+
+    @staticmethod
+    def version() -> str:
+        """Stands in for the weights hash; changes with the stub settings"""
+        settings = f"stub:{STUB_SEED}:{STUB_DETECTIONS}:{STUB_COMPUTE_MS}"
+        return hashlib.sha256(settings.encode()).hexdigest()[:12]
+
+    def load(self):
+        self.model_name = "stub"
+        self.names = dict(enumerate(CANCER_CLASSES))
+
+    def predict(self, images: List[np.ndarray], conf: float) -> List[tuple]:
+        return [self._predict_one(image, conf) for image in images]
+
+    def _predict_one(self, image: np.ndarray, conf: float) -> tuple:
+        deadline = time.perf_counter() + STUB_COMPUTE_MS / 1000.0
+        work = letterbox(image, EXPORT_IMGSZ)
+        while time.perf_counter() < deadline:
+            work = cv2.GaussianBlur(work, (5, 5), 0)
 
-        # Get image dimensions
         height, width = image.shape[:2]
+        image_hash = hashlib.blake2b(np.ascontiguousarray(image[::16, ::16]).tobytes(), digest_size=8)
+        rng = np.random.default_rng([STUB_SEED, int.from_bytes(image_hash.digest(), "little")])
 
-        detections = []
-        max_confidence = 0.0
-        top_class = "normal"
+        count = max(0, STUB_DETECTIONS)
+        box_w = rng.uniform(0.02, 0.1, count) * width
+        box_h = rng.uniform(0.02, 0.1, count) * height
+        x1 = rng.uniform(0, 1, count) * (width - box_w)
+        y1 = rng.uniform(0, 1, count) * (height - box_h)
+        xyxy = np.stack([x1, y1, x1 + box_w, y1 + box_h], axis=1).astype(np.float32)
+        confidences = rng.uniform(max(conf, 0.05), 0.99, count).astype(np.float32)
+        class_ids = rng.integers(0, len(self.names), count)
+        return xyxy, confidences, class_ids
 
-        # Process results
-        for r in results:
-            boxes = r.boxes
-
-            if boxes is not None and len(boxes) > 0:
-                for box in boxes:
-                    cls_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    class_name = model.names[cls_id]
-
-                    # Get bounding box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-
-                    # Update max confidence and top class
-                    if confidence > max_confidence:
-                        max_confidence = confidence
-                        top_class = class_name
-
-                    # Calculate approximate size in mm (assuming standard CT scan)
-                    # This is a rough estimate - in production, use actual pixel spacing from DICOM
-                    pixel_width = float(x2 - x1)
-                    pixel_height = float(y2 - y1)
-                    avg_size_px = (pixel_width + pixel_height) / 2
-                    size_mm = float(avg_size_px * 0.5)  # Rough conversion factor
-
-                    # Determine shape based on aspect ratio
-                    aspect_ratio = float(pixel_width / pixel_height if pixel_height > 0 else 1.0)
-                    if 0.8 <= aspect_ratio <= 1.2:
-                        shape = "round"
-                    elif aspect_ratio > 1.2:
-                        shape = "oval"
-                    else:
-                        shape = "irregular"
-
-                    detections.append({
-                        "class": class_name,
-                        "confidence": round(confidence, 3),
-                        "boundingBox": {
-                            "x": int(x1),
-                            "y": int(y1),
-                            "width": int(x2 - x1),
-                            "height": int(y2 - y1)
-                        },
-                        "characteristics": {
-                            "size_mm": round(size_mm, 1),
-                            "shape": shape,
-                            "density": "solid"  # Default - would need additional analysis
-                        }
-                    })
-
-        # If no detections, classify as normal with lower confidence
-        if len(detections) == 0:
-            top_class = "normal"
-            max_confidence = 0.5  # Lower confidence for normal classification
-
-        detected = top_class != "normal"
 
-        return {
-            "detected": detected,
-            "confidence": float(max_confidence),
-            "topClass": top_class,
-            "detections": detections,
-            "imageSize": {"width": int(width), "height": int(height)}
-        }
+INFERENCE_BACKENDS = {
+    backend.name: backend
+    for backend in (PyTorchBackend, OnnxRuntimeBackend, OpenVINOBackend, OnnxInt8Backend, StubBackend)
+}
 
-    except Exception as e:
-        print(f"Error during YOLO inference: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
+
+def create_inference_backend(name: str, weights_path: str, weights_hash: str,
+                             model_name: Optional[str] = None) -> InferenceBackend:
+    """Instantiate the inference backend registered under name"""
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend '{name}'. Supported backends: {', '.join(INFERENCE_BACKENDS)}"
+        )
+    return INFERENCE_BACKENDS[name](weights_path, weights_hash, model_name)
+
+
+def synthetic_ct_image(size: int = 640) -> np.ndarray:
+    """CT-like RGB test image (body, lungs, spine) for warm-up and benchmarks"""
+    image = np.zeros((size, size), dtype=np.uint8)
+    center = size // 2
+    cv2.ellipse(image, (center, center), (int(0.45 * size), int(0.35 * size)), 0, 0, 360, 110, -1)
+    for side in (-1, 1):
+        cv2.ellipse(image, (center + side * int(0.18 * size), center),
+                    (int(0.12 * size), int(0.22 * size)), 0, 0, 360, 25, -1)
+    cv2.circle(image, (center, int(0.72 * size)), int(0.04 * size), 230, -1)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
 
 
-def create_annotated_image(image: np.ndarray, detections: List[dict]) -> bytes:
+def warm_up_backend(backend: InferenceBackend) -> dict:
     """
-    Create annotated image with bounding boxes, edge detection, and contour analysis
+    Run WARMUP_RUNS inferences at every batch size in WARMUP_BATCH_SIZES
 
-    Args:
-        image: Original image
-        detections: List of detection dictionaries
+    Triggers lazy graph initialization and allocator growth before the first
+    real request pays for it.
 
     Returns:
-        Annotated image as JPEG bytes with enhanced visualizations
+        Batch size to warm-up latencies in milliseconds
     """
-    annotated = image.copy()
-
-    # Convert to grayscale for edge detection and contour analysis
-    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-
-    # === EDGE DETECTION ===
-    # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-    # Canny edge detection with automatic threshold
-    median_val = np.median(blurred)
-    lower = int(max(0, 0.66 * median_val))
-    upper = int(min(255, 1.33 * median_val))
-    edges = cv2.Canny(blurred, lower, upper)
-
-    # Overlay edges in cyan (semi-transparent)
-    edge_overlay = annotated.copy()
-    edge_overlay[edges > 0] = [0, 255, 255]  # Cyan for edges
-    annotated = cv2.addWeighted(annotated, 0.85, edge_overlay, 0.15, 0)
-
-    # === CONTOUR ANALYSIS ===
-    # Find contours
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    # Draw significant contours
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        # Only draw contours above minimum area (to reduce noise)
-        if area > 100:
-            perimeter = cv2.arcLength(contour, True)
-            circularity = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
-
-            # Color code by circularity (more circular = more suspicious)
-            if circularity > 0.7:
-                contour_color = (255, 100, 255)  # Purple for circular (potential nodules)
-            else:
-                contour_color = (100, 200, 255)  # Light blue for irregular shapes
+    report = {}
+    image = synthetic_ct_image()
+    for batch_size in WARMUP_BATCH_SIZES:
+        latencies = []
+        for _ in range(WARMUP_RUNS):
+            start = time.perf_counter()
+            backend.predict([image] * batch_size, CONF_THRESHOLD)
+            latencies.append(round((time.perf_counter() - start) * 1000, 1))
+        report[str(batch_size)] = latencies
+    return report
 
-            # Draw contour with semi-transparency
-            cv2.drawContours(annotated, [contour], -1, contour_color, 1)
+
+def load_model():
+    """
+    Load the YOLOv12 model (ACTIVE_MODEL from the registry, else best.pt)
+
+    The model is warmed up before it is published, so MODEL_LOADED means
+    requests will not pay for initialization.
+    """
+    global MODEL_LOADED, MODEL_STATE, warmup_report
+    try:
+        backend_class = INFERENCE_BACKENDS.get(INFERENCE_BACKEND, PyTorchBackend)
+        if ACTIVE_MODEL:
+            weights_path, model_name = model_registry.path(ACTIVE_MODEL), ACTIVE_MODEL
+        else:
+            weights_path, model_name = MODEL_PATH, None
+        if backend_class.requires_weights and not os.path.exists(weights_path):
+            print(f"Error: Model file '{weights_path}' not found in current directory")
+            print(f"Current directory: {os.getcwd()}")
+            print("Please ensure best.pt is in the same directory as backend_server.py")
+            MODEL_STATE = "failed"
+            return False
+
+        MODEL_STATE = "loading"
+        print(f"Loading YOLO model from {weights_path} ({INFERENCE_BACKEND} backend)...")
+        version = file_sha256(weights_path)[:12] if backend_class.requires_weights else StubBackend.version()
+        backend = create_inference_backend(INFERENCE_BACKEND, weights_path, version, model_name)
+        backend.load()
+
+        MODEL_STATE = "warming_up"
+        warmup_report = warm_up_backend(backend)
+        print(f"Warm-up latencies (ms) by batch size: {warmup_report}")
+
+        activate_backend(backend)
+        MODEL_LOADED = True
+        MODEL_STATE = "ready"
+        print(f"Model loaded successfully!")
+        print(f"Model classes: {backend.names}")
+        return True
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        traceback.print_exc()
+        MODEL_LOADED = False
+        MODEL_STATE = "failed"
+        return False
+
+
+def activate_backend(backend: InferenceBackend):
+    """
+    Atomically make a loaded backend the one new inferences use
+
+    Inference snapshots the model reference once per call, so calls already
+    running finish on the previous backend, which is released afterwards.
+    """
+    global model, MODEL_PATH, MODEL_VERSION, MODEL_NAME
+    MODEL_PATH, MODEL_VERSION, MODEL_NAME = backend.weights_path, backend.weights_hash, backend.model_name
+    model = backend
+
+
+class ModelRegistry:
+    """
+    Directory of versioned model weights, one <version>.pt file per version
+
+    New versions are added by copying weights into the directory.
+    """
+
+    VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, version: str) -> str:
+        """Weights path of a version; KeyError if it is not in the registry"""
+        path = os.path.join(self.directory, f"{version}.pt")
+        if not self.VERSION_PATTERN.match(version) or not os.path.isfile(path):
+            raise KeyError(version)
+        return path
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        versions = []
+        for filename in sorted(os.listdir(self.directory)):
+            version, ext = os.path.splitext(filename)
+            if ext != ".pt" or not self.VERSION_PATTERN.match(version):
+                continue
+            path = os.path.join(self.directory, filename)
+            versions.append({
+                "version": version,
+                "sizeBytes": os.path.getsize(path),
+                "modifiedAt": datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat(),
+                "active": version == MODEL_NAME
+            })
+        return versions
+
+
+model_registry = ModelRegistry(MODEL_REGISTRY_DIR)
+
+
+class ModelReloader:
+    """
+    Loads a registry version in the background, warms it up and swaps it in
+
+    One reload runs at a time. The serving model keeps handling requests
+    until the new one is ready; if loading fails nothing changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.status = {"state": "idle"}
+
+    def start(self, version: str) -> dict:
+        """Start reloading to version; raises KeyError or RuntimeError (busy)"""
+        weights_path = model_registry.path(version)
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise RuntimeError(f"Reload to {self.status['version']} is already running")
+            self.status = {
+                "state": "loading",
+                "version": version,
+                "previousVersion": MODEL_NAME,
+                "startedAt": datetime.utcnow().isoformat()
+            }
+            self._thread = threading.Thread(
+                target=self._run, args=(version, weights_path), name="model-reloader", daemon=True
+            )
+            self._thread.start()
+            return dict(self.status)
+
+    def _run(self, version: str, weights_path: str):
+        global MODEL_LOADED, MODEL_STATE, warmup_report
+        try:
+            weights_hash = file_sha256(weights_path)[:12]
+            backend = create_inference_backend(INFERENCE_BACKEND, weights_path, weights_hash, version)
+            backend.load()
+            self._update(state="warming_up", modelVersion=weights_hash)
+            report = warm_up_backend(backend)
+
+            activate_backend(backend)
+            warmup_report = report
+            MODEL_LOADED, MODEL_STATE = True, "ready"
+            self._update(state="completed", finishedAt=datetime.utcnow().isoformat())
+            print(f"Model {version} ({weights_hash}) is now serving")
+        except Exception as e:
+            print(f"Error reloading model {version}: {e}")
+            traceback.print_exc()
+            self._update(state="failed", error=str(e), finishedAt=datetime.utcnow().isoformat())
+
+    def _update(self, **fields):
+        with self._lock:
+            self.status.update(fields)
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return dict(self.status)
+
+
+model_reloader = ModelReloader()
+
+
+def start_model_loading() -> threading.Thread:
+    """Load and warm up the model in a background thread so startup returns at once"""
+    thread = threading.Thread(target=load_model, name="model-loader", daemon=True)
+    thread.start()
+    return thread
+
+
+def export_model_artifact() -> Optional[str]:
+    """
+    Build the export used by INFERENCE_BACKEND ahead of time (e.g. at image build)
+
+    Returns:
+        Path to the exported model, or None if the backend runs best.pt directly
+        (or needs no weights)
+    """
+    if not INFERENCE_BACKENDS.get(INFERENCE_BACKEND, PyTorchBackend).requires_weights:
+        return None
+    backend = create_inference_backend(INFERENCE_BACKEND, MODEL_PATH, file_sha256(MODEL_PATH)[:12])
+    if getattr(backend, "export_format", None) is None:
+        return None
+    return backend.artifact_path()
+
+
+@functools.lru_cache(maxsize=64)
+def _minmax_lut(dtype_str: str, lo: int, hi: int) -> np.ndarray:
+    """
+    uint8 lookup table reproducing (v - lo) / (hi - lo) * 255 for every stored value
+
+    The table is indexed by the unsigned view of the pixel data, so signed
+    images need no offset pass. Slices of a series usually share the same
+    range, so tables are cached.
+    """
+    dtype = np.dtype(dtype_str)
+    index_dtype = np.uint8 if dtype.itemsize == 1 else np.uint16
+    values = np.arange(np.iinfo(index_dtype).max + 1, dtype=index_dtype).view(dtype).astype(np.float64)
+
+    if hi == lo:
+        return np.zeros(len(values), dtype=np.uint8)
+
+    lut = (values - lo) / (hi - lo) * 255
+    np.clip(lut, 0, 255, out=lut)  # Only values inside [lo, hi] occur in the slice
+    return lut.astype(np.uint8)
+
+
+def normalize_to_uint8(img: np.ndarray) -> np.ndarray:
+    """
+    Min-max normalize pixel data to 8-bit (0-255)
+
+    8/16-bit integer data goes through a cached lookup table (one gather, no
+    float temporaries); anything else uses in-place float32 math. Constant
+    images map to zeros instead of dividing by zero.
+    """
+    if img.ndim == 2 and img.dtype in (np.uint8, np.int8, np.uint16, np.int16):
+        lo, hi, _, _ = cv2.minMaxLoc(img)
+    else:
+        lo, hi = img.min(), img.max()
+
+    if img.dtype in (np.uint8, np.int8, np.uint16, np.int16):
+        lut = _minmax_lut(img.dtype.str, int(lo), int(hi))
+        index_dtype = np.uint8 if img.dtype.itemsize == 1 else np.uint16
+        return lut[img.view(index_dtype)]
+
+    if hi == lo:
+        return np.zeros(img.shape, dtype=np.uint8)
+
+    img = img.astype(np.float32)
+    img -= np.float32(lo)
+    img *= np.float32(255.0 / (float(hi) - float(lo)))
+    np.clip(img, 0, 255, out=img)
+    return img.astype(np.uint8)
+
+
+def dicom_window_bounds(window: str) -> Optional[tuple]:
+    """
+    Get the (width, level) of a DICOM window
+
+    Args:
+        window: "minmax", a DICOM_WINDOW_PRESETS name, or "custom:<width>:<level>"
+
+    Returns:
+        (width, level) in Hounsfield units, or None for min-max normalization
+    """
+    if window == "minmax":
+        return None
+    if window in DICOM_WINDOW_PRESETS:
+        return DICOM_WINDOW_PRESETS[window]
+
+    name, width, level = window.split(":")
+    width, level = float(width), float(level)
+    if name != "custom" or not (math.isfinite(width) and math.isfinite(level)) or width <= 0:
+        raise ValueError(f"Invalid DICOM window '{window}'")
+    return width, level
+
+
+def resolve_dicom_window(window: Optional[str] = None, window_width: Optional[float] = None,
+                         window_level: Optional[float] = None) -> str:
+    """
+    Validate a request's DICOM window selection
+
+    Args:
+        window: Preset name ("minmax", "lung", "mediastinal", "custom"), or None for the default
+        window_width: Custom window width in Hounsfield units
+        window_level: Custom window level (center) in Hounsfield units
+
+    Returns:
+        Window specification accepted by read_dicom_image
+    """
+    if window_width is not None or window_level is not None:
+        if window not in (None, "custom") or window_width is None or window_level is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Custom DICOM windows need both window_width and window_level"
+            )
+        # repr round-trips exactly, so distinct windows never share a cache key
+        window = f"custom:{float(window_width)!r}:{float(window_level)!r}"
+    else:
+        window = (window or DEFAULT_DICOM_WINDOW).lower()
+
+    try:
+        dicom_window_bounds(window)
+    except ValueError:
+        supported = ", ".join(["minmax", *DICOM_WINDOW_PRESETS, "custom"])
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid DICOM window '{window}'. Supported windows: {supported} "
+                   "(custom needs a finite window_width > 0 and window_level)"
+        )
+    return window
+
+
+def dicom_window_metadata(window: str) -> dict:
+    """Describe a DICOM window for scan metadata"""
+    bounds = dicom_window_bounds(window)
+    if bounds is None:
+        return {"preset": window}
+    return {"preset": window.split(":")[0], "width": bounds[0], "level": bounds[1]}
+
+
+@functools.lru_cache(maxsize=64)
+def _window_lut(dtype_str: str, slope: float, intercept: float,
+                width: float, level: float) -> np.ndarray:
+    """
+    uint8 lookup table mapping every stored value through rescale and a W/L window
+
+    Keyed by pixel dtype (bit depth and signedness), rescale parameters and
+    window, which are shared by every slice of a series.
+    """
+    dtype = np.dtype(dtype_str)
+    index_dtype = np.uint8 if dtype.itemsize == 1 else np.uint16
+    values = np.arange(np.iinfo(index_dtype).max + 1, dtype=index_dtype).view(dtype).astype(np.float64)
+
+    hounsfield = values * slope + intercept
+    lut = (hounsfield - (level - width / 2)) / width * 255
+    np.clip(lut, 0, 255, out=lut)
+    return np.rint(lut).astype(np.uint8)
+
+
+def apply_dicom_window(img: np.ndarray, slope: float, intercept: float,
+                       width: float, level: float) -> np.ndarray:
+    """
+    Convert stored pixel values to Hounsfield units and window them to 8-bit
+
+    8/16-bit integer data is converted with one lookup-table gather; anything
+    else uses in-place float32 math.
+    """
+    if img.dtype in (np.uint8, np.int8, np.uint16, np.int16):
+        lut = _window_lut(img.dtype.str, slope, intercept, width, level)
+        index_dtype = np.uint8 if img.dtype.itemsize == 1 else np.uint16
+        return lut[img.view(index_dtype)]
+
+    img = img.astype(np.float32)
+    img *= np.float32(slope * 255.0 / width)
+    img += np.float32((intercept - (level - width / 2)) * 255.0 / width)
+    np.clip(img, 0, 255, out=img)
+    return np.rint(img, out=img).astype(np.uint8)
+
+
+def read_dicom_image(file_bytes: bytes, window: str = DEFAULT_DICOM_WINDOW) -> np.ndarray:
+    """
+    Read a DICOM image and convert to RGB format
+
+    Args:
+        file_bytes: DICOM file bytes
+        window: DICOM window from resolve_dicom_window
+
+    Returns:
+        Image in RGB format as numpy array
+    """
+    if not DICOM_SUPPORT:
+        raise HTTPException(
+            status_code=400,
+            detail="DICOM support not available. Please install pydicom."
+        )
+
+    try:
+        # Parse straight from the upload buffer - no temporary file
+        ds = pydicom.dcmread(io.BytesIO(file_bytes))
+        if int(ds.get("NumberOfFrames", 1) or 1) > 1:
+            raise ValueError("multi-frame DICOM, upload it to /api/v1/scan/volume-analyze")
+        return dicom_pixels_to_rgb(ds, ds.pixel_array, window)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading DICOM file: {str(e)}")
+
+
+def dicom_rescale(ds) -> tuple:
+    """Get a dataset's (slope, intercept), including enhanced multi-frame objects"""
+    if "RescaleSlope" in ds or "RescaleIntercept" in ds:
+        return float(ds.get("RescaleSlope", 1) or 1), float(ds.get("RescaleIntercept", 0) or 0)
+
+    try:
+        transform = ds.SharedFunctionalGroupsSequence[0].PixelValueTransformationSequence[0]
+        return float(transform.RescaleSlope), float(transform.RescaleIntercept)
+    except (AttributeError, IndexError):
+        return 1.0, 0.0
+
+
+def dicom_pixels_to_rgb(ds, img: np.ndarray, window: str = DEFAULT_DICOM_WINDOW) -> np.ndarray:
+    """
+    Convert one decoded DICOM slice to 8-bit RGB
+
+    Args:
+        ds: Dataset the pixels came from (for rescale and samples per pixel)
+        img: Stored pixel values of a single slice or frame
+        window: DICOM window from resolve_dicom_window
+
+    Returns:
+        Image in RGB format as numpy array
+    """
+    # Window in Hounsfield units, or normalize to 8-bit range (0-255)
+    bounds = dicom_window_bounds(window)
+    if bounds is not None and ds.get("SamplesPerPixel", 1) == 1:
+        img = apply_dicom_window(img, *dicom_rescale(ds), *bounds)
+    else:
+        img = normalize_to_uint8(img)
+
+    # Convert to RGB (DICOM images are often grayscale)
+    if len(img.shape) == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    return img
+
+
+def scan_extension(filename: str) -> str:
+    """Lower-cased file extension, keeping compound extensions like .nii.gz"""
+    name = filename.lower()
+    if name.endswith(".nii.gz"):
+        return ".nii.gz"
+    return os.path.splitext(name)[1]
+
+
+def scan_window(filename: str, window: str) -> str:
+    """The window an upload is decoded with; PNG and JPEG ignore it, so they share the default"""
+    if scan_extension(filename) in ['.dcm', '.dicom', *NIFTI_FORMATS]:
+        return window
+    return DEFAULT_DICOM_WINDOW
+
+
+@timed_stage("read_image")
+def read_image(file_bytes: bytes, filename: str, window: str = DEFAULT_DICOM_WINDOW) -> np.ndarray:
+    """
+    Read image file (DICOM, NIfTI, JPEG, PNG) and convert to RGB
+
+    Args:
+        file_bytes: Image file bytes
+        filename: Original filename to determine format
+        window: DICOM window from resolve_dicom_window (ignored for other formats)
+
+    Returns:
+        Image in RGB format as numpy array
+    """
+    file_ext = scan_extension(filename)
+
+    try:
+        # Handle DICOM files
+        if file_ext in ['.dcm', '.dicom']:
+            return read_dicom_image(file_bytes, window)
+
+        # Handle NIfTI volumes holding a single slice
+        if file_ext in NIFTI_FORMATS:
+            return read_nifti_image(file_bytes, filename, window)
+
+        # Handle standard image formats
+        nparr = np.frombuffer(file_bytes, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+        if img is None:
+            raise ValueError(f"Could not decode image from {filename}")
+
+        # Convert BGR to RGB
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return img_rgb
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading image: {str(e)}")
+
+
+class MultiFrameDicom:
+    """
+    Decode a multi-frame DICOM once and hand out its frames
+
+    The decoded frames are released as soon as the last one has been taken.
+    """
+
+    def __init__(self, contents: bytes, num_frames: int):
+        self._contents = contents
+        self._remaining = num_frames
+        self._ds = None
+        self._frames = None
+        self._lock = threading.Lock()
+
+    def frame(self, index: int, window: str) -> np.ndarray:
+        with self._lock:
+            if self._frames is None:
+                self._ds = pydicom.dcmread(io.BytesIO(self._contents))
+                self._frames = self._ds.pixel_array
+                self._contents = None
+            ds, frame = self._ds, self._frames[index]
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._ds = self._frames = None
+        return dicom_pixels_to_rgb(ds, frame, window)
+
+
+def _plane_position(position, orientation) -> Optional[float]:
+    """Distance of a slice along its normal, from ImagePositionPatient/ImageOrientationPatient"""
+    if position is None:
+        return None
+    if orientation is None:
+        return float(position[2])
+    normal = np.cross(np.asarray(orientation[:3], dtype=float), np.asarray(orientation[3:], dtype=float))
+    return float(np.dot(normal, np.asarray(position, dtype=float)))
+
+
+def _frame_positions(header, num_frames: int) -> List[Optional[float]]:
+    """Slice positions of every frame, using per-frame functional groups when present"""
+    orientation = header.get("ImageOrientationPatient")
+    try:
+        orientation = orientation or \
+            header.SharedFunctionalGroupsSequence[0].PlaneOrientationSequence[0].ImageOrientationPatient
+    except (AttributeError, IndexError):
+        pass
+
+    try:
+        positions = [
+            _plane_position(item.PlanePositionSequence[0].ImagePositionPatient, orientation)
+            for item in header.PerFrameFunctionalGroupsSequence
+        ]
+        if len(positions) == num_frames:
+            return positions
+    except (AttributeError, IndexError):
+        pass
+    return [_plane_position(header.get("ImagePositionPatient"), orientation)] * num_frames
+
+
+def collect_dicom_volume(uploads: List[tuple], window: str) -> tuple:
+    """
+    Expand uploaded DICOM files, zip archives and multi-frame objects into sorted slices
+
+    Only headers are parsed here. Slices are sorted by their position along
+    the slice normal (ImagePositionPatient/ImageOrientationPatient), falling
+    back to InstanceNumber and then upload order.
+
+    Args:
+        uploads: (filename, contents) pairs
+        window: DICOM window from resolve_dicom_window
+
+    Returns:
+        (slices, sorted_by). Each slice is a dict with its source name, frame,
+        instance number, position and a "decode" callable returning RGB.
+    """
+    objects = []
+    total_bytes = 0
+    for filename, contents in uploads:
+        if zipfile.is_zipfile(io.BytesIO(contents)):
+            with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or os.path.basename(info.filename).upper() == "DICOMDIR":
+                        continue
+                    total_bytes += info.file_size
+                    if total_bytes > MAX_VOLUME_SIZE:
+                        raise HTTPException(status_code=400, detail="Volume exceeds MAX_VOLUME_SIZE")
+                    objects.append((f"{filename}/{info.filename}", archive.read(info), True))
+        else:
+            total_bytes += len(contents)
+            objects.append((filename, contents, False))
+
+    if total_bytes > MAX_VOLUME_SIZE:
+        raise HTTPException(status_code=400, detail="Volume exceeds MAX_VOLUME_SIZE")
+
+    slices = []
+    for name, contents, from_archive in objects:
+        try:
+            header = pydicom.dcmread(io.BytesIO(contents), stop_before_pixels=True)
+            if "Rows" not in header:
+                raise ValueError("no image data")
+        except Exception as e:
+            if from_archive:
+                continue  # Archives often carry non-image files next to the series
+            raise HTTPException(status_code=400, detail=f"Error reading DICOM file {name}: {str(e)}")
+
+        num_frames = int(header.get("NumberOfFrames", 1) or 1)
+        instance_number = header.get("InstanceNumber")
+        instance_number = int(instance_number) if instance_number is not None else None
+        if num_frames > 1:
+            source = MultiFrameDicom(contents, num_frames)
+            decoders = [functools.partial(source.frame, index, window) for index in range(num_frames)]
+        else:
+            decoders = [functools.partial(read_dicom_image, contents, window)]
+
+        for index, position in enumerate(_frame_positions(header, num_frames)):
+            slices.append({
+                "source": name,
+                "frame": index + 1,
+                "instanceNumber": instance_number,
+                "position": round(position, 3) if position is not None else None,
+                "decode": decoders[index]
+            })
+
+    if not slices:
+        raise HTTPException(status_code=400, detail="No DICOM slices found in upload")
+
+    # Stable sorts keep frames and duplicates in upload order
+    if all(item["position"] is not None for item in slices):
+        slices.sort(key=lambda item: item["position"])
+        sorted_by = "position"
+    elif all(item["instanceNumber"] is not None for item in slices):
+        slices.sort(key=lambda item: item["instanceNumber"])
+        sorted_by = "instanceNumber"
+    else:
+        sorted_by = "upload"
+    return slices, sorted_by
+
+
+class NiftiVolume:
+    """
+    Axial slices of a NIfTI volume, read lazily from a memory-mapped file
+
+    Uploads are copied (and .nii.gz decompressed) to a temporary .nii file
+    once; voxel data is then memory-mapped, so only the slices being decoded
+    are paged in. Slices are windowed like DICOM, with scl_slope/scl_inter as
+    the rescale, and oriented for radiological display (anterior up, patient
+    right on the image left).
+    """
+
+    def __init__(self, path: str, owns_path: bool = False):
+        self.path = path
+        self._owns_path = owns_path
+
+        header = nib.load(path).header
+        shape = tuple(int(n) for n in header.get_data_shape())
+        if len(shape) > 4 or header.get_data_dtype().fields is not None:
+            raise ValueError(f"unsupported NIfTI data (shape {shape}, dtype {header.get_data_dtype()})")
+        self._data = np.memmap(path, dtype=header.get_data_dtype(), mode="r",
+                               offset=int(header.get_data_offset()), shape=shape, order="F")
+        if self._data.ndim == 4:
+            self._data = self._data[..., 0]  # First time point of 4D series
+        elif self._data.ndim == 2:
+            self._data = self._data[..., np.newaxis]
+
+        slope, intercept = header.get_slope_inter()
+        self.slope = float(slope) if slope else 1.0  # scl_slope of 0 means unscaled
+        self.intercept = float(intercept) if intercept is not None else 0.0
+        self.affine = header.get_best_affine()
+
+        self._axis, self._transpose, self._flip = self._orientation(self.affine)
+
+    @classmethod
+    @timed_stage("upload_read")
+    def from_upload(cls, fileobj, filename: str, max_bytes: int = MAX_VOLUME_SIZE) -> "NiftiVolume":
+        """Copy an uploaded .nii/.nii.gz to a temporary file and open it"""
+        fd, path = tempfile.mkstemp(suffix=".nii")
+        try:
+            source = fileobj
+            if scan_extension(filename) == ".nii.gz":
+                # Spooled uploads are opened w+b, so GzipFile would default to write mode
+                source = gzip.GzipFile(fileobj=fileobj, mode="rb")
+            written = 0
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise ValueError("volume exceeds MAX_VOLUME_SIZE")
+                    out.write(chunk)
+            return cls(path, owns_path=True)
+        except Exception:
+            os.unlink(path)
+            raise
+
+    @staticmethod
+    def _orientation(affine: np.ndarray) -> tuple:
+        """Slice axis, in-plane transpose and (row, column) flips from the affine"""
+        codes = nib.aff2axcodes(affine)
+        axial = [i for i, code in enumerate(codes) if code in ("S", "I")]
+        if len(axial) != 1 or None in codes:
+            return 2, False, (False, False)  # Degenerate affine: slice the last axis as stored
+
+        in_plane = [code for i, code in enumerate(codes) if i != axial[0]]
+        transpose = in_plane[0] in ("L", "R")  # Rows should run anterior to posterior
+        rows, cols = (in_plane[1], in_plane[0]) if transpose else (in_plane[0], in_plane[1])
+        return axial[0], transpose, (rows == "A", cols == "R")
+
+    def __len__(self) -> int:
+        return self._data.shape[self._axis]
+
+    def position(self, index: int) -> float:
+        """Superior-inferior world coordinate (mm) of a slice"""
+        voxel = np.zeros(3)
+        voxel[self._axis] = index
+        return float(self.affine[2, :3] @ voxel + self.affine[2, 3])
+
+    def slice(self, index: int, window: str = DEFAULT_DICOM_WINDOW) -> np.ndarray:
+        """Decode one axial slice to RGB"""
+        selector = [slice(None)] * 3
+        selector[self._axis] = index
+        img = self._data[tuple(selector)]
+        if self._transpose:
+            img = img.T
+        if self._flip[0]:
+            img = img[::-1]
+        if self._flip[1]:
+            img = img[:, ::-1]
+        img = np.ascontiguousarray(img)  # Pages in just this slice
+        if not img.dtype.isnative:
+            img = img.astype(img.dtype.newbyteorder("="))
+
+        bounds = dicom_window_bounds(window)
+        if bounds is not None:
+            img = apply_dicom_window(img, self.slope, self.intercept, *bounds)
+        else:
+            img = normalize_to_uint8(img)
+            if self.slope < 0:
+                img = 255 - img  # Min-max of the rescaled values
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+
+    def slice_entries(self, name: str, window: str) -> List[dict]:
+        """Slices in the format of collect_dicom_volume, ordered inferior to superior"""
+        slices = [
+            {
+                "source": name,
+                "frame": index + 1,
+                "instanceNumber": None,
+                "position": round(self.position(index), 3),
+                "decode": functools.partial(self.slice, index, window)
+            }
+            for index in range(len(self))
+        ]
+        slices.sort(key=lambda item: item["position"])
+        return slices
+
+    def close(self):
+        """Release the memory map and remove the temporary copy"""
+        self._data = None
+        if self._owns_path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def read_nifti_image(file_bytes: bytes, filename: str, window: str = DEFAULT_DICOM_WINDOW) -> np.ndarray:
+    """
+    Read a single-slice NIfTI image and convert to RGB format
+
+    Args:
+        file_bytes: .nii or .nii.gz file bytes
+        filename: Original filename (for gzip detection)
+        window: DICOM window from resolve_dicom_window
+
+    Returns:
+        Image in RGB format as numpy array
+    """
+    if not NIFTI_SUPPORT:
+        raise HTTPException(
+            status_code=400,
+            detail="NIfTI support not available. Please install nibabel."
+        )
+
+    volume = NiftiVolume.from_upload(io.BytesIO(file_bytes), filename)
+    try:
+        if len(volume) > 1:
+            raise ValueError("multi-slice NIfTI volume, upload it to /api/v1/scan/volume-analyze")
+        return volume.slice(0, window)
+    finally:
+        volume.close()
+
+
+def get_risk_level(confidence: float, class_name: str) -> str:
+    """
+    Determine risk level based on confidence score and class
+
+    Args:
+        confidence: Model confidence score (0-1)
+        class_name: Predicted class name
+
+    Returns:
+        Risk level: 'high', 'medium', 'low', or 'none'
+    """
+    # If normal, return none
+    if class_name == "normal":
+        return "none"
+
+    # For cancer classes, use confidence thresholds
+    if confidence >= 0.8:
+        return "high"
+    elif confidence >= 0.5:
+        return "medium"
+    elif confidence >= 0.3:
+        return "low"
+    else:
+        return "none"
+
+
+def generate_scan_id() -> str:
+    """Generate unique scan ID"""
+    return f"scan_{uuid.uuid4().hex[:12]}"
+
+
+def validate_scan_format(filename: str) -> str:
+    """
+    Check that an upload has a supported extension
+
+    Returns:
+        Lower-cased file extension
+    """
+    file_ext = scan_extension(filename)
+
+    if file_ext not in ALLOWED_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file format. Supported formats: {', '.join(ALLOWED_FORMATS)}"
+        )
+
+    return file_ext
+
+
+def validate_scan_size(size: int, max_bytes: int = MAX_UPLOAD_SIZE):
+    """Reject uploads above max_bytes"""
+    if size > max_bytes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File size exceeds {max_bytes // (1024 * 1024)}MB limit"
+        )
+
+
+def upload_body_limit(path: str) -> Optional[int]:
+    """Request body limit for an upload endpoint, or None for other paths"""
+    return UPLOAD_BODY_LIMITS.get(path.rstrip("/"))
+
+
+class SpooledUpload:
+    """
+    An upload as Starlette spooled it, with its size and SHA-256
+
+    Starlette has already written the part to a temporary file (in memory
+    while small, on disk above that) when the form was parsed, so the file
+    is hashed in place rather than copied again. It stays there until the
+    request is admitted for processing, and Starlette closes it afterwards.
+    """
+
+    def __init__(self, fileobj, filename: str):
+        self.file = fileobj
+        self.filename = filename
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    @classmethod
+    @timed_stage("upload_read")
+    def receive(cls, fileobj, filename: str, max_bytes: int = MAX_UPLOAD_SIZE) -> "SpooledUpload":
+        """Hash an upload chunk by chunk, stopping as soon as it exceeds max_bytes"""
+        upload = cls(fileobj, filename)
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b""):
+            validate_scan_size(upload.size + len(chunk), max_bytes)
+            upload.size += len(chunk)
+            upload._digest.update(chunk)
+        return upload
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def read_bytes(self) -> bytes:
+        """Load the whole upload (blocking; call once the request is admitted)"""
+        self.file.seek(0)
+        return self.file.read()
+
+
+async def receive_upload(scan: UploadFile, max_bytes: int = MAX_UPLOAD_SIZE) -> SpooledUpload:
+    """
+    Size-check and hash an upload without holding it in memory
+
+    Uploads whose part size is already known to exceed max_bytes are rejected
+    without reading them.
+    """
+    if getattr(scan, "size", None) is not None:
+        validate_scan_size(scan.size, max_bytes)
+    # Runs before admission, so it must not queue on the inference pool
+    return await run_in_pool(SpooledUpload.receive, scan.file, scan.filename, max_bytes,
+                             executor=io_executor)
+
+
+def sniff_image_media_type(contents: bytes) -> Optional[str]:
+    """Media type of uploads that browsers can display as-is (PNG/JPEG)"""
+    if contents.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if contents.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    return None
+
+
+@timed_stage("encode")
+def encode_canonical_png(image: np.ndarray) -> bytes:
+    """Losslessly encode a decoded image (e.g. from DICOM) once for serving"""
+    image = np.asarray(image)
+    if np.array_equal(image[..., 0], image[..., 1]) and np.array_equal(image[..., 0], image[..., 2]):
+        image = image[..., 0]  # Grayscale slice: a single-channel PNG is a third of the size
+    else:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    _, buffer = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    return buffer.tobytes()
+
+
+def store_scan_result(image: Optional[np.ndarray], results: dict, contents: bytes,
+                      filename: str, processing_time: float,
+                      cache_hit: bool = False, window: str = DEFAULT_DICOM_WINDOW) -> dict:
+    """
+    Register an analyzed scan and build its API response
+
+    Args:
+        image: Decoded image (RGB), or None to decode lazily from contents
+        results: Detection results from process_image_with_yolo
+        contents: Upload bytes
+        filename: Upload filename
+        processing_time: Decode plus inference time in seconds
+        cache_hit: Whether the results came from the result cache
+        window: DICOM window the image was decoded with
+
+    Returns:
+        Scan response dictionary (also stored in scans_db)
+    """
+    # Generate scan ID
+    scan_id = generate_scan_id()
+    file_ext = scan_extension(filename)
+
+    # Determine risk level
+    risk_level = get_risk_level(results["confidence"], results["topClass"])
+
+    # Store images for later retrieval. PNG/JPEG uploads are served back as
+    # uploaded; other formats get one canonical PNG encoding at ingest.
+    media_type = sniff_image_media_type(contents)
+    if media_type is not None:
+        scan_images.put(scan_id, image, results["detections"],
+                        encoded=contents, media_type=media_type)
+    elif image is not None:
+        scan_images.put(scan_id, image, results["detections"],
+                        encoded=encode_canonical_png(image), media_type="image/png")
+    else:
+        scan_images.put(scan_id, None, results["detections"], source=(contents, filename, window))
+
+    # Create response with full URLs for CORS
+    base_url = "http://localhost:8000"  # Use the backend URL
+    response_data = {
+        "scanId": scan_id,
+        "status": "completed",
+        "uploadTime": datetime.utcnow().isoformat(),
+        "processingTime": round(processing_time, 2),
+        "results": {
+            "detected": results["detected"],
+            "confidence": round(results["confidence"], 3),
+            "riskLevel": risk_level,
+            "topClass": results["topClass"],
+            "detections": results["detections"],
+            "imageUrl": f"{base_url}/api/v1/scan/{scan_id}/image",
+            "annotatedImageUrl": f"{base_url}/api/v1/scan/{scan_id}/annotated"
+        },
+        "metadata": {
+            "imageSize": results["imageSize"],
+            "fileSize": len(contents),
+            "format": file_ext.upper().lstrip('.'),
+            "cacheHit": cache_hit,
+            "modelVersion": results.get("modelVersion"),
+            "modelName": results.get("modelName")
+        }
+    }
+    if file_ext in ['.dcm', '.dicom', *NIFTI_FORMATS]:
+        response_data["metadata"]["window"] = dicom_window_metadata(window)
+
+    # Store in database
+    scans_db[scan_id] = response_data
+
+    # Cache hits keep the image undecoded; it is only decoded if /annotated is requested
+    if not cache_hit:
+        schedule_annotated_render(scan_id)
+
+    return response_data
+
+
+def detections_from_arrays(xyxy: np.ndarray, confidences: np.ndarray, class_ids: np.ndarray,
+                           names: dict, width: int, height: int) -> dict:
+    """
+    Build the API detection structure from per-box arrays
+
+    Args:
+        xyxy: (N, 4) float32 box corners
+        confidences: (N,) float32 confidence scores
+        class_ids: (N,) class indices
+        names: Class index to class name mapping
+        width: Image width
+        height: Image height
+
+    Returns:
+        Dictionary with detection results
+    """
+    detections = []
+    max_confidence = 0.0
+    top_class = "normal"
+
+    if len(confidences) > 0:
+        x1, y1 = xyxy[:, 0], xyxy[:, 1]
+        pixel_width = xyxy[:, 2] - x1
+        pixel_height = xyxy[:, 3] - y1
+
+        # Calculate approximate size in mm (assuming standard CT scan)
+        # This is a rough estimate - in production, use actual pixel spacing from DICOM
+        width64 = pixel_width.astype(np.float64)
+        height64 = pixel_height.astype(np.float64)
+        size_mm = (width64 + height64) / 2 * 0.5  # Rough conversion factor
+
+        # Determine shape based on aspect ratio
+        aspect_ratio = np.divide(width64, height64, out=np.ones_like(width64), where=height64 > 0)
+        shape = np.where(
+            (aspect_ratio >= 0.8) & (aspect_ratio <= 1.2), "round",
+            np.where(aspect_ratio > 1.2, "oval", "irregular")
+        )
+
+        # Top class is the first box with the highest (non-zero) confidence
+        top_index = int(np.argmax(confidences))
+        if confidences[top_index] > max_confidence:
+            max_confidence = float(confidences[top_index])
+            top_class = names[int(class_ids[top_index])]
+
+        for cls_id, confidence, x, y, w, h, size, box_shape in zip(
+            class_ids.tolist(), confidences.tolist(),
+            x1.astype(np.int64).tolist(), y1.astype(np.int64).tolist(),
+            pixel_width.astype(np.int64).tolist(), pixel_height.astype(np.int64).tolist(),
+            size_mm.tolist(), shape.tolist()
+        ):
+            detections.append({
+                "class": names[int(cls_id)],
+                "confidence": round(confidence, 3),
+                "boundingBox": {
+                    "x": x,
+                    "y": y,
+                    "width": w,
+                    "height": h
+                },
+                "characteristics": {
+                    "size_mm": round(size, 1),
+                    "shape": box_shape,
+                    "density": "solid"  # Default - would need additional analysis
+                }
+            })
+
+    # If no detections, classify as normal with lower confidence
+    if len(detections) == 0:
+        top_class = "normal"
+        max_confidence = 0.5  # Lower confidence for normal classification
+
+    detected = top_class != "normal"
+
+    return {
+        "detected": detected,
+        "confidence": float(max_confidence),
+        "topClass": top_class,
+        "detections": detections,
+        "imageSize": {"width": int(width), "height": int(height)}
+    }
+
+
+def _result_arrays(r) -> tuple:
+    """
+    (xyxy, confidences, class_ids) of a single YOLO result as NumPy arrays
+
+    Boxes, confidences and classes are moved to NumPy in one transfer each
+    instead of one tensor conversion per box.
+    """
+    boxes = r.boxes
+    if boxes is not None and len(boxes) > 0:
+        xyxy = boxes.xyxy.cpu().numpy()
+        confidences = boxes.conf.cpu().numpy()
+        class_ids = boxes.cls.cpu().numpy().astype(np.int64)
+    else:
+        xyxy = np.zeros((0, 4), dtype=np.float32)
+        confidences = np.zeros(0, dtype=np.float32)
+        class_ids = np.zeros(0, dtype=np.int64)
+    return xyxy, confidences, class_ids
+
+
+def _detections_from_result(r, image: np.ndarray, names: dict) -> dict:
+    """
+    Convert a single YOLO result into the API detection structure
+
+    Args:
+        r: Ultralytics result for one image
+        image: The image the result was produced from (RGB)
+        names: Class index to class name mapping
+
+    Returns:
+        Dictionary with detection results
+    """
+    # Get image dimensions
+    height, width = image.shape[:2]
+
+    return detections_from_arrays(*_result_arrays(r), names, width, height)
+
+
+@timed_stage("inference")
+def process_images_with_yolo(images: List[np.ndarray]) -> List[dict]:
+    """
+    Process a batch of CT scan images with a single YOLOv12 model call
+
+    Args:
+        images: Input images as numpy arrays (RGB)
+
+    Returns:
+        List of detection result dictionaries, one per image
+    """
+    # One snapshot per call: a hot-reload swap never splits a batch
+    backend = model
+    if not MODEL_LOADED or backend is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded. Please check server logs."
+        )
+
+    try:
+        # Run YOLO inference on the whole batch
+        with backend.lock:
+            outputs = backend.predict(images, CONF_THRESHOLD)
+
+        results = []
+        for arrays, image in zip(outputs, images):
+            result = detections_from_arrays(*arrays, backend.names, image.shape[1], image.shape[0])
+            result.update(modelVersion=backend.weights_hash, modelName=backend.model_name,
+                          modelBackend=backend.cache_tag)
+            results.append(result)
+        return results
+
+    except Exception as e:
+        print(f"Error during YOLO inference: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
+
+
+def process_image_with_yolo(image: np.ndarray) -> dict:
+    """
+    Process CT scan image with YOLOv12 model
+
+    Args:
+        image: Input image as numpy array (RGB)
+
+    Returns:
+        Dictionary with detection results
+    """
+    return process_images_with_yolo([image])[0]
+
+
+class InferenceBatcher:
+    """
+    Micro-batching scheduler for single-image inference requests
+
+    Concurrent requests are queued and collected for up to max_wait_ms (or
+    until max_batch_size images are waiting), then run through the model in
+    one batched call. Each caller receives its own result through a Future.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+        self._images_processed = 0
+
+    def start(self):
+        """Start the background batching thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the batching thread after the queued requests are served"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, image: np.ndarray) -> Future:
+        """Queue an image for inference and return a Future for its result"""
+        future = Future()
+        # The batch runs on the batcher thread, so carry the request's timings and profile along
+        self._queue.put((image, future, request_timings.get(), request_profile.get()))
+        with self._stats_lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    async def infer(self, image: np.ndarray) -> dict:
+        """Await the batched inference result for a single image"""
+        return await asyncio.wrap_future(self.submit(image))
+
+    def _collect_batch(self, first) -> list:
+        """Gather queued requests until the batch is full or the wait window closes"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the stop sentinel so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect_batch(first)
+            # Skip requests whose callers have already gone away
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._images_processed += len(batch)
+
+            start = time.perf_counter()
+            profiles = [profile for *_, profile in batch if profile is not None]
+            try:
+                with flight_recorder.attach(profiles):
+                    results = process_images_with_yolo([image for image, *_ in batch])
+            except Exception as e:
+                for _, future, *_ in batch:
+                    future.set_exception(e)
+                continue
+
+            elapsed = time.perf_counter() - start
+            for (_, future, timings, _), result in zip(batch, results):
+                if timings is not None:
+                    timings["inference"] = timings.get("inference", 0.0) + elapsed
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Queue depth and batch-size histogram for monitoring"""
+        with self._stats_lock:
+            histogram = {str(size): count for size, count in sorted(self._batch_sizes.items())}
+            batches = sum(self._batch_sizes.values())
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": self.max_wait_ms,
+                "queueDepth": self._queue.qsize(),
+                "maxQueueDepth": self._max_queue_depth,
+                "batchesRun": batches,
+                "imagesProcessed": self._images_processed,
+                "averageBatchSize": round(self._images_processed / batches, 2) if batches else 0.0,
+                "batchSizeHistogram": histogram
+            }
+
+
+batcher = InferenceBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+
+class ScanImageStore:
+    """
+    Byte-budgeted store of scan images with LRU spill to local disk
+
+    Each scan keeps the encoded bytes served by /image (the original PNG/JPEG
+    upload or a canonical PNG), the decoded RGB image when available, and for
+    cache-hit DICOM scans the raw upload to decode lazily. Up to max_bytes of
+    this is kept in memory. Colder scans are written to spill_dir - decoded
+    images as .npy files, single-channel when grayscale, read back through a
+    memory map - and once spill files exceed max_spill_bytes the oldest are
+    deleted.
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: Optional[str] = None,
+                 max_spill_bytes: int = 10 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = spill_dir is None
+        self._entries = {}  # scan_id -> entry dict
+        self._memory = OrderedDict()  # scan_id -> bytes held in memory (LRU order)
+        self._spilled = OrderedDict()  # scan_id -> bytes on disk (oldest first)
+        self._memory_bytes = 0
+        self._spill_bytes = 0
+        self._counters = Counter()
+        self._lock = threading.RLock()
+
+    def __contains__(self, scan_id: str) -> bool:
+        return scan_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _resident_bytes(entry: dict) -> int:
+        nbytes = entry["image"].nbytes if entry["image"] is not None else 0
+        for field in ("encoded", "source"):
+            if entry[field] is not None:
+                nbytes += len(entry[field])
+        return nbytes
+
+    def _spill_path(self, scan_id: str, suffix: str) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="scan_images_")
+        os.makedirs(self._spill_dir, exist_ok=True)
+        return os.path.join(self._spill_dir, scan_id + suffix)
+
+    def put(self, scan_id: str, image: Optional[np.ndarray], detections: List[dict],
+            encoded: Optional[bytes] = None, media_type: Optional[str] = None,
+            source: Optional[tuple] = None):
+        """
+        Store a scan's image data
+
+        Args:
+            scan_id: Scan ID
+            image: Decoded image (RGB), or None if not decoded yet
+            detections: Detections drawn on the annotated render
+            encoded: Bytes served by /image, or None to produce them lazily
+            media_type: Media type of the encoded bytes
+            source: Raw (contents, filename, window) upload to decode when nothing else is stored
+        """
+        entry = {
+            "image": image,
+            "encoded": encoded,
+            "media_type": media_type,
+            "source": source[0] if source else None,
+            "filename": source[1] if source else None,
+            "window": source[2] if source else None,
+            "detections": detections,
+            "paths": {}
+        }
+        with self._lock:
+            self._entries[scan_id] = entry
+            nbytes = self._resident_bytes(entry)
+            self._memory[scan_id] = nbytes
+            self._memory_bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            scan_id, nbytes = self._memory.popitem(last=False)
+            self._memory_bytes -= nbytes
+            self._spill(scan_id)
+
+        while self._spill_bytes > self.max_spill_bytes and self._spilled:
+            scan_id, nbytes = self._spilled.popitem(last=False)
+            self._spill_bytes -= nbytes
+            entry = self._entries.pop(scan_id)
+            for path in entry["paths"].values():
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            self._counters["dropped"] += 1
+
+    def _spill(self, scan_id: str):
+        entry = self._entries[scan_id]
+        paths = {}
+        try:
+            image = entry["image"]
+            if image is not None:
+                # CT slices are grayscale expanded to RGB; keep one channel on disk
+                if image.ndim == 3 and image.shape[2] == 3 and \
+                        np.array_equal(image[..., 0], image[..., 1]) and \
+                        np.array_equal(image[..., 0], image[..., 2]):
+                    image = image[..., 0]
+                paths["image"] = self._spill_path(scan_id, ".npy")
+                np.save(paths["image"], np.ascontiguousarray(image), allow_pickle=False)
+
+            for field, suffix in (("encoded", ".enc"), ("source", ".src")):
+                if entry[field] is not None:
+                    paths[field] = self._spill_path(scan_id, suffix)
+                    with open(paths[field], "wb") as f:
+                        f.write(entry[field])
+        except OSError as e:
+            print(f"Warning: could not spill scan image {scan_id}: {e}")
+            for path in paths.values():
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            self._entries.pop(scan_id)
+            self._counters["dropped"] += 1
+            return
+
+        entry.update(image=None, encoded=None, source=None, paths=paths)
+        nbytes = sum(os.path.getsize(path) for path in paths.values())
+        self._spilled[scan_id] = nbytes
+        self._spill_bytes += nbytes
+        self._counters["spills"] += 1
+
+    def _snapshot(self, scan_id: str) -> dict:
+        """Copy an entry's fields and mark it recently used (KeyError if not stored)"""
+        with self._lock:
+            entry = self._entries[scan_id]
+            if scan_id in self._memory:
+                self._memory.move_to_end(scan_id)
+            return dict(entry, paths=dict(entry["paths"]))
+
+    def _read_field(self, scan_id: str, snapshot: dict, field: str) -> Optional[bytes]:
+        if snapshot[field] is not None:
+            return snapshot[field]
+        path = snapshot["paths"].get(field)
+        if path is None:
+            return None
+        with self._lock:
+            self._counters["diskReads"] += 1
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(scan_id) from None  # Evicted since the snapshot
+
+    def _attach(self, scan_id: str, **fields):
+        """Keep data produced on demand if the scan is still held in memory"""
+        with self._lock:
+            if scan_id not in self._memory:
+                return
+            entry = self._entries[scan_id]
+            entry.update(fields)
+            nbytes = self._resident_bytes(entry)
+            self._memory_bytes += nbytes - self._memory[scan_id]
+            self._memory[scan_id] = nbytes
+            self._evict()
+
+    def get_detections(self, scan_id: str) -> List[dict]:
+        """Get a scan's detections (KeyError if the scan is not or no longer stored)"""
+        with self._lock:
+            return self._entries[scan_id]["detections"]
+
+    def get_image(self, scan_id: str) -> np.ndarray:
+        """
+        Get a scan image (RGB), from memory, from its spill file, or by decoding
+
+        Raises KeyError if the scan is not stored, including when it is
+        evicted while being read.
+        """
+        snapshot = self._snapshot(scan_id)
+        if snapshot["image"] is not None:
+            with self._lock:
+                self._counters["memoryReads"] += 1
+            return snapshot["image"]
+
+        path = snapshot["paths"].get("image")
+        if path is not None:
+            with self._lock:
+                self._counters["diskReads"] += 1
+            try:
+                image = np.load(path, mmap_mode="r")
+            except FileNotFoundError:
+                raise KeyError(scan_id) from None  # Evicted since the snapshot
+            if image.ndim == 2:
+                image = cv2.cvtColor(np.asarray(image), cv2.COLOR_GRAY2RGB)
+            return image
+
+        # Never decoded (cache-hit scan): decode the served bytes or the raw upload
+        encoded = self._read_field(scan_id, snapshot, "encoded")
+        if encoded is not None:
+            image = cv2.cvtColor(cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_COLOR),
+                                 cv2.COLOR_BGR2RGB)
+        else:
+            image = read_image(self._read_field(scan_id, snapshot, "source"), snapshot["filename"],
+                               snapshot["window"])
+        self._attach(scan_id, image=image)
+        return image
+
+    def get_encoded(self, scan_id: str) -> tuple:
+        """Get the (bytes, media_type) served for a scan's original image (KeyError if not stored)"""
+        snapshot = self._snapshot(scan_id)
+        encoded = self._read_field(scan_id, snapshot, "encoded")
+        if encoded is not None:
+            if snapshot["encoded"] is not None:
+                with self._lock:
+                    self._counters["memoryReads"] += 1
+            return encoded, snapshot["media_type"]
+
+        # Cache-hit DICOM scan: produce its canonical encoding on first request
+        encoded = encode_canonical_png(self.get_image(scan_id))
+        self._attach(scan_id, encoded=encoded, media_type="image/png", source=None)
+        return encoded, "image/png"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "scans": len(self._entries),
+                "inMemory": len(self._memory),
+                "memoryBytes": self._memory_bytes,
+                "maxMemoryBytes": self.max_bytes,
+                "spilled": len(self._spilled),
+                "spillBytes": self._spill_bytes,
+                "maxSpillBytes": self.max_spill_bytes,
+                **self._counters
+            }
+
+    def close(self):
+        """Remove the spill directory if the store created it"""
+        if self._owns_spill_dir and self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+
+scan_images = ScanImageStore(SCAN_STORE_MAX_BYTES, SCAN_SPILL_DIR, SCAN_SPILL_MAX_BYTES)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of inference results
+
+    Entries are kept in an LRU under a memory budget (sized by their JSON
+    encoding). If a directory is given, entries are also written through to
+    disk so evicted or pre-restart results can still be served; once the
+    files exceed max_disk_bytes the oldest are deleted.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = RESULT_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self._files = OrderedDict()  # disk path -> size (oldest first)
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._index_disk()
+
+    def _index_disk(self):
+        """Account for files left by earlier runs, oldest first"""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                try:
+                    stat = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, os.path.join(self.disk_dir, name), stat.st_size))
+        with self._lock:
+            for _, path, size in sorted(files):
+                self._files[path] = size
+                self._disk_bytes += size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._files:
+            path, size = self._files.popitem(last=False)
+            self._disk_bytes -= size
+            self._counters["diskEvictions"] += 1
+            try:
+                os.unlink(path)
+            except OSError:
+                pass  # Already removed (e.g. by another worker sharing the directory)
+
+    @staticmethod
+    def make_key(content_hash: str, window: str = DEFAULT_DICOM_WINDOW,
+                 model_version: Optional[str] = None, backend_tag: Optional[str] = None) -> str:
+        """
+        Key results by upload hash, model version, backend and inference parameters
+
+        model_version and backend_tag default to the serving model's, so an
+        onnx-int8 backend that fell back to FP32 files its results as pytorch.
+        """
+        backend = model
+        if model_version is None:
+            model_version = backend.weights_hash if backend is not None else MODEL_VERSION
+        if backend_tag is None:
+            backend_tag = backend.cache_tag if backend is not None else INFERENCE_BACKEND
+        return f"{content_hash}:{model_version}:{backend_tag}:conf={CONF_THRESHOLD}:window={window}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _insert(self, key: str, result: dict, size: int):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (result, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "r") as f:
+                    encoded = f.read()
+                result = json.loads(encoded)
+            except (OSError, ValueError):
+                result = None
+            if result is not None:
+                with self._lock:
+                    self._insert(key, result, len(encoded))
+                    self._counters["hits"] += 1
+                    self._counters["diskHits"] += 1
+                return result
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, result: dict):
+        encoded = json.dumps(result)
+        with self._lock:
+            self._insert(key, result, len(encoded))
+
+        if self.disk_dir and len(encoded) <= self.max_disk_bytes:
+            path = self._disk_path(key)
+            try:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(encoded)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Warning: could not write result cache entry to disk: {e}")
+                return
+            with self._lock:
+                self._disk_bytes += len(encoded) - self._files.pop(path, 0)
+                self._files[path] = len(encoded)
+                self._evict_disk()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._counters["hits"]
+            misses = self._counters["misses"]
+            return {
+                "hits": hits,
+                "misses": misses,
+                "diskHits": self._counters["diskHits"],
+                "evictions": self._counters["evictions"],
+                "diskEvictions": self._counters["diskEvictions"],
+                "hitRate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "diskTier": bool(self.disk_dir),
+                "diskEntries": len(self._files),
+                "diskBytes": self._disk_bytes,
+                "maxDiskBytes": self.max_disk_bytes
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DIR)
+
+
+JOB_TERMINAL_STATES = ("completed", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue already holds JOB_QUEUE_LIMIT queued jobs"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+class InMemoryJobQueue:
+    """
+    Bounded priority queue of scan analysis jobs kept in process memory
+
+    Higher priority jobs are claimed first, FIFO within a priority. Upload
+    bytes are dropped as soon as a job reaches a terminal state, and the job
+    itself retention_seconds later.
+    """
+
+    def __init__(self, max_queued: int, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._cond = threading.Condition()
+        self._heap = []  # (-priority, sequence, job_id)
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._payloads = {}
+        self._queued = 0
+        self._finished = deque()  # (monotonic finish time, job_id), oldest first
+
+    def _mark_finished(self, job: dict):
+        job["finishedAt"] = datetime.utcnow().isoformat()
+        self._finished.append((time.monotonic(), job["jobId"]))
+
+    def _purge(self):
+        """Forget terminal jobs finished more than retention_seconds ago"""
+        cutoff = time.monotonic() - self.retention_seconds
+        while self._finished and self._finished[0][0] < cutoff:
+            _, job_id = self._finished.popleft()
+            self._jobs.pop(job_id, None)
+
+    def submit(self, filename: str, contents: bytes, priority: int = 0,
+               window: str = DEFAULT_DICOM_WINDOW) -> dict:
+        with self._cond:
+            self._purge()
+            if self._queued >= self.max_queued:
+                raise JobQueueFull()
+
+            job = new_job(filename, priority, window)
+            self._jobs[job["jobId"]] = job
+            self._payloads[job["jobId"]] = contents
+            self._queued += 1
+            heapq.heappush(self._heap, (-priority, next(self._seq), job["jobId"]))
+            self._cond.notify()
+            return dict(job)
+
+    def claim(self, timeout: float) -> Optional[tuple]:
+        """Take the highest priority queued job, waiting up to timeout seconds"""
+        with self._cond:
+            deadline = time.monotonic() + timeout
+            while True:
+                while self._heap:
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self._jobs.get(job_id)
+                    if job is not None and job["status"] == "queued":
+                        self._queued -= 1
+                        job["status"] = "running"
+                        job["startedAt"] = datetime.utcnow().isoformat()
+                        return dict(job), self._payloads[job_id]
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._cond:
+            job = self._jobs[job_id]
+            self._payloads.pop(job_id, None)
+            if job["status"] != "cancelled":
+                job["status"] = "failed" if error else "completed"
+                job["result"] = result
+                job["error"] = error
+            self._mark_finished(job)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] not in JOB_TERMINAL_STATES:
+                if job["status"] == "queued":
+                    self._queued -= 1
+                    self._payloads.pop(job_id, None)
+                    self._mark_finished(job)
+                job["status"] = "cancelled"
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job is not None and job["status"] == "cancelled"
+
+    def queued_count(self) -> int:
+        with self._cond:
+            return self._queued
+
+
+class SQLiteJobQueue:
+    """
+    Bounded priority job queue persisted in a local SQLite database
+
+    Queued jobs survive a restart; jobs left running by a crashed process are
+    put back in the queue on startup. Pre-forked workers share the database,
+    each through its own connection, and claim jobs atomically. Terminal jobs
+    are deleted retention_seconds after they finish.
+    """
+
+    def __init__(self, db_path: str, max_queued: int, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.db_path = db_path
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._cond = threading.Condition()
+        self._conn = None
+        self._conn_pid = None
+        self._next_purge = 0.0
+
+        # Schema setup and crash recovery run once, in the process creating the
+        # queue (the parent when workers are pre-forked), on a connection that
+        # is closed again so no connection is inherited across fork()
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        job_id TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        priority INTEGER NOT NULL,
+                        filename TEXT NOT NULL,
+                        dicom_window TEXT,
+                        payload BLOB,
+                        result TEXT,
+                        error TEXT,
+                        created_at TEXT NOT NULL,
+                        started_at TEXT,
+                        finished_at TEXT
+                    )
+                """)
+                columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+                if "dicom_window" not in columns:  # Databases created before DICOM windows
+                    conn.execute("ALTER TABLE jobs ADD COLUMN dicom_window TEXT")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+                )
+        finally:
+            conn.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use (SQLite connections must not cross fork())"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _to_job(row) -> dict:
+        return {
+            "jobId": row["job_id"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "filename": row["filename"],
+            "window": row["dicom_window"] or DEFAULT_DICOM_WINDOW,
+            "createdAt": row["created_at"],
+            "startedAt": row["started_at"],
+            "finishedAt": row["finished_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"]
+        }
+
+    def _purge(self):
+        """Delete terminal jobs finished more than retention_seconds ago (at most once a minute)"""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + JOB_PURGE_INTERVAL_SECONDS
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.retention_seconds)).isoformat()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at < ? AND status IN ('completed', 'failed', 'cancelled')",
+                (cutoff,)
+            )
+
+    def submit(self, filename: str, contents: bytes, priority: int = 0,
+               window: str = DEFAULT_DICOM_WINDOW) -> dict:
+        with self._cond:
+            self._purge()
+            if self.queued_count() >= self.max_queued:
+                raise JobQueueFull()
+
+            job = new_job(filename, priority, window)
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, status, priority, filename, dicom_window, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job["jobId"], job["status"], priority, filename, window, contents, job["createdAt"])
+                )
+            self._cond.notify()
+            return job
+
+    def claim(self, timeout: float) -> Optional[tuple]:
+        """Take the highest priority queued job, waiting up to timeout seconds"""
+        with self._cond:
+            conn = self._connection()
+            deadline = time.monotonic() + timeout
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' "
+                    "ORDER BY priority DESC, rowid LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    started_at = datetime.utcnow().isoformat()
+                    with conn:
+                        claimed = conn.execute(
+                            "UPDATE jobs SET status = 'running', started_at = ? "
+                            "WHERE job_id = ? AND status = 'queued'",
+                            (started_at, row["job_id"])
+                        ).rowcount
+                    if not claimed:  # Claimed by another worker process (or cancelled) meanwhile
+                        continue
+                    job = self._to_job(row)
+                    job.update(status="running", startedAt=started_at)
+                    return job, row["payload"]
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._cond:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN status = 'cancelled' THEN status ELSE ? END, "
+                    "result = ?, error = ?, payload = NULL, finished_at = ? WHERE job_id = ?",
+                    ("failed" if error else "completed", json.dumps(result) if result else None,
+                     error, datetime.utcnow().isoformat(), job_id)
+                )
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET finished_at = ?, payload = NULL WHERE job_id = ? AND status = 'queued'",
+                    (datetime.utcnow().isoformat(), job_id)
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled' WHERE job_id = ? AND status IN ('queued', 'running')",
+                    (job_id,)
+                )
+            return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return self._to_job(row) if row is not None else None
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._cond:
+            row = self._connection().execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return row is not None and row["status"] == "cancelled"
+
+    def queued_count(self) -> int:
+        with self._cond:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+
+
+def new_job(filename: str, priority: int, window: str = DEFAULT_DICOM_WINDOW) -> dict:
+    """Create the public record for a newly queued job"""
+    return {
+        "jobId": f"job_{uuid.uuid4().hex[:12]}",
+        "status": "queued",
+        "priority": priority,
+        "filename": filename,
+        "window": window,
+        "createdAt": datetime.utcnow().isoformat(),
+        "startedAt": None,
+        "finishedAt": None,
+        "result": None,
+        "error": None
+    }
+
+
+def create_job_queue():
+    """Create the job queue backend selected by JOB_BACKEND"""
+    if JOB_BACKEND == "sqlite":
+        return SQLiteJobQueue(JOB_DB_PATH, JOB_QUEUE_LIMIT)
+    return InMemoryJobQueue(JOB_QUEUE_LIMIT)
+
+
+def analyze_scan_job(filename: str, contents: bytes, window: str = DEFAULT_DICOM_WINDOW,
+                     is_cancelled=lambda: False) -> dict:
+    """
+    Run the single-scan analysis pipeline for a queued job
+
+    Raises JobCancelled instead of storing the scan (or, after decoding,
+    instead of running inference) once is_cancelled() returns True.
+    """
+    start_time = time.perf_counter()
+    window = scan_window(filename, window)  # PNG/JPEG share the default window's cache key
+
+    cache_key = ResultCache.make_key(hashlib.sha256(contents).hexdigest(), window)
+    results = result_cache.get(cache_key)
+    if results is not None:
+        if is_cancelled():
+            raise JobCancelled()
+        processing_time = time.perf_counter() - start_time
+        return store_scan_result(None, results, contents, filename, processing_time,
+                                 cache_hit=True, window=window)
+
+    image = read_image(contents, filename, window)
+    if is_cancelled():
+        raise JobCancelled()
+    results = batcher.submit(image).result()
+    # Keyed by the version that produced it, in case a reload swapped models meanwhile
+    result_cache.put(ResultCache.make_key(hashlib.sha256(contents).hexdigest(), window,
+                                          results["modelVersion"], results["modelBackend"]), results)
+    if is_cancelled():
+        raise JobCancelled()
+    processing_time = time.perf_counter() - start_time
+    return store_scan_result(image, results, contents, filename, processing_time, window=window)
+
+
+class JobWorkerPool:
+    """Background threads that drain the job queue through the inference pipeline"""
+
+    def __init__(self, job_queue, num_workers: int):
+        self.job_queue = job_queue
+        self.num_workers = max(1, num_workers)
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while not self._stopping.is_set():
+            claimed = self.job_queue.claim(timeout=0.5)
+            if claimed is None:
+                continue
+
+            job, contents = claimed
+            try:
+                result = analyze_scan_job(job["filename"], contents, job["window"],
+                                          lambda: self.job_queue.is_cancelled(job["jobId"]))
+                self.job_queue.finish(job["jobId"], result=result)
+            except JobCancelled:
+                self.job_queue.finish(job["jobId"])  # Stays cancelled; records finishedAt
+            except HTTPException as e:
+                self.job_queue.finish(job["jobId"], error=str(e.detail))
+            except Exception as e:
+                print(f"Error processing job {job['jobId']}: {e}")
+                traceback.print_exc()
+                self.job_queue.finish(job["jobId"], error=f"Processing error: {str(e)}")
+
+
+job_queue = create_job_queue()
+job_workers = JobWorkerPool(job_queue, JOB_WORKERS)
+
+
+def create_annotated_image(image: np.ndarray, detections: List[dict],
+                           show_edges: bool = True, show_contours: bool = True,
+                           show_legend: bool = True) -> bytes:
+    """
+    Create annotated image with bounding boxes, edge detection, and contour analysis
+
+    Args:
+        image: Original image
+        detections: List of detection dictionaries
+        show_edges: Overlay Canny edges
+        show_contours: Draw significant contours
+        show_legend: Append the legend strip below the image
+
+    Returns:
+        Annotated image as JPEG bytes with enhanced visualizations
+    """
+    return encode_annotated_jpeg(
+        render_annotated_image(image, detections, show_edges, show_contours, show_legend)
+    )
+
+
+@timed_stage("annotate")
+def render_annotated_image(image: np.ndarray, detections: List[dict],
+                           show_edges: bool = True, show_contours: bool = True,
+                           show_legend: bool = True) -> np.ndarray:
+    """Draw the create_annotated_image visualizations; returns the RGB image"""
+    annotated = image.copy()
+
+    if show_edges or show_contours:
+        # Convert to grayscale for edge detection and contour analysis
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+        # === EDGE DETECTION ===
+        # Apply Gaussian blur to reduce noise
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        # Canny edge detection with automatic threshold
+        median_val = np.median(blurred)
+        lower = int(max(0, 0.66 * median_val))
+        upper = int(min(255, 1.33 * median_val))
+        edges = cv2.Canny(blurred, lower, upper)
+
+    if show_edges:
+        # Overlay edges in cyan (semi-transparent)
+        edge_overlay = annotated.copy()
+        edge_overlay[edges > 0] = [0, 255, 255]  # Cyan for edges
+        annotated = cv2.addWeighted(annotated, 0.85, edge_overlay, 0.15, 0)
+
+    if show_contours:
+        # === CONTOUR ANALYSIS ===
+        # Find contours
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Draw significant contours
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            # Only draw contours above minimum area (to reduce noise)
+            if area > 100:
+                perimeter = cv2.arcLength(contour, True)
+                circularity = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
+
+                # Color code by circularity (more circular = more suspicious)
+                if circularity > 0.7:
+                    contour_color = (255, 100, 255)  # Purple for circular (potential nodules)
+                else:
+                    contour_color = (100, 200, 255)  # Light blue for irregular shapes
+
+                # Draw contour with semi-transparency
+                cv2.drawContours(annotated, [contour], -1, contour_color, 1)
 
     # === YOLO DETECTION BOUNDING BOXES ===
     # Color map for different classes
@@ -358,87 +3208,395 @@ def create_annotated_image(image: np.ndarray, detections: List[dict]) -> bytes:
         "normal": (0, 255, 0)               # Green
     }
 
-    for det in detections:
-        bbox = det["boundingBox"]
-        x, y, w, h = bbox["x"], bbox["y"], bbox["width"], bbox["height"]
-        class_name = det["class"]
-        confidence = det["confidence"]
+    for det in detections:
+        bbox = det["boundingBox"]
+        x, y, w, h = bbox["x"], bbox["y"], bbox["width"], bbox["height"]
+        class_name = det["class"]
+        confidence = det["confidence"]
+
+        color = color_map.get(class_name, (0, 255, 255))
+
+        # Draw bounding box (thicker for detections)
+        cv2.rectangle(annotated, (x, y), (x + w, y + h), color, 3)
+
+        # Draw corner markers for emphasis
+        corner_length = 15
+        # Top-left
+        cv2.line(annotated, (x, y), (x + corner_length, y), color, 4)
+        cv2.line(annotated, (x, y), (x, y + corner_length), color, 4)
+        # Top-right
+        cv2.line(annotated, (x + w, y), (x + w - corner_length, y), color, 4)
+        cv2.line(annotated, (x + w, y), (x + w, y + corner_length), color, 4)
+        # Bottom-left
+        cv2.line(annotated, (x, y + h), (x + corner_length, y + h), color, 4)
+        cv2.line(annotated, (x, y + h), (x, y + h - corner_length), color, 4)
+        # Bottom-right
+        cv2.line(annotated, (x + w, y + h), (x + w - corner_length, y + h), color, 4)
+        cv2.line(annotated, (x + w, y + h), (x + w, y + h - corner_length), color, 4)
+
+        # Draw label background
+        label = f"{class_name}: {confidence:.2f}"
+        (label_w, label_h), baseline = cv2.getTextSize(
+            label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2
+        )
+        cv2.rectangle(
+            annotated,
+            (x, y - label_h - 15),
+            (x + label_w + 10, y),
+            color,
+            -1
+        )
+
+        # Draw label text
+        cv2.putText(
+            annotated,
+            label,
+            (x + 5, y - 8),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            (255, 255, 255),
+            2
+        )
+
+    # === ADD LEGEND ===
+    if show_legend:
+        legend_height = 100
+        legend = np.zeros((legend_height, annotated.shape[1], 3), dtype=np.uint8)
+        legend.fill(30)  # Dark background
+
+        # Legend text
+        legend_items = [
+            ("Edges: Cyan", (0, 255, 255)),
+            ("Contours: Purple (circular) / Blue (irregular)", (255, 100, 255)),
+            ("Detections: Colored boxes with corners", (255, 255, 255))
+        ]
+
+        y_offset = 25
+        for i, (text, color) in enumerate(legend_items):
+            cv2.putText(legend, text, (10, y_offset + i * 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
+        # Combine image with legend
+        annotated = np.vstack([annotated, legend])
+
+    return annotated
+
+
+@timed_stage("encode")
+def encode_annotated_jpeg(annotated: np.ndarray) -> bytes:
+    """Convert an annotated RGB image to JPEG bytes"""
+    annotated_bgr = cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR)
+    _, buffer = cv2.imencode('.jpg', annotated_bgr, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return buffer.tobytes()
+
+
+DEFAULT_RENDER_OPTIONS = (True, True, True)  # (edges, contours, legend)
+
+
+class AnnotatedRenderCache:
+    """
+    LRU cache of annotated JPEG renders keyed by scan ID and render options
+
+    A scan's image and detections never change, so the ETag is derived from
+    the key alone and conditional requests can be answered without rendering.
+    Concurrent requests for the same render share a single rendering.
+    """
+
+    def __init__(self, max_bytes: int, eager_limit: int):
+        self.max_bytes = max_bytes
+        self.eager_limit = max(0, eager_limit)
+        self._entries = OrderedDict()  # (scan_id, options) -> JPEG bytes
+        self._bytes = 0
+        self._rendering = {}  # (scan_id, options) -> Future
+        self._eager_pending = 0
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    @staticmethod
+    def etag(scan_id: str, options: tuple) -> str:
+        key = f"{scan_id}:{options}:{ANNOTATION_RENDER_VERSION}"
+        return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+    def get(self, scan_id: str, options: tuple) -> Optional[bytes]:
+        with self._lock:
+            rendered = self._entries.get((scan_id, options))
+            if rendered is not None:
+                self._entries.move_to_end((scan_id, options))
+                self._counters["hits"] += 1
+            return rendered
+
+    def get_or_render(self, scan_id: str, options: tuple = DEFAULT_RENDER_OPTIONS) -> bytes:
+        """Return the cached render, rendering it (once) if needed"""
+        key = (scan_id, options)
+        with self._lock:
+            rendered = self._entries.get(key)
+            if rendered is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return rendered
+
+            future = self._rendering.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._rendering[key] = future
+                self._counters["renders"] += 1
+            else:
+                self._counters["sharedRenders"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            show_edges, show_contours, show_legend = options
+            rendered = create_annotated_image(
+                scan_images.get_image(scan_id),
+                scan_images.get_detections(scan_id),
+                show_edges=show_edges,
+                show_contours=show_contours,
+                show_legend=show_legend
+            )
+        except Exception as e:
+            with self._lock:
+                del self._rendering[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._rendering[key]
+            if len(rendered) <= self.max_bytes:
+                self._entries[key] = rendered
+                self._bytes += len(rendered)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+                    self._counters["evictions"] += 1
+        future.set_result(rendered)
+        return rendered
+
+    def render_in_background(self, scan_id: str):
+        """
+        Queue the default render on the inference pool
+
+        At most eager_limit renders are pending at once; further ones are
+        dropped (and rendered on first request instead), so eager rendering
+        cannot pile up unbounded work behind the pool under load.
+        """
+        with self._lock:
+            if self._eager_pending >= self.eager_limit:
+                self._counters["eagerDropped"] += 1
+                return
+            self._eager_pending += 1
+
+        def render():
+            try:
+                self.get_or_render(scan_id)
+            except Exception as e:
+                print(f"Warning: background annotation of {scan_id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._eager_pending -= 1
+
+        try:
+            inference_executor.submit(render)
+        except RuntimeError:  # Pool already shut down
+            with self._lock:
+                self._eager_pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "eager": ANNOTATE_EAGERLY,
+                "eagerPending": self._eager_pending,
+                "eagerLimit": self.eager_limit,
+                **self._counters
+            }
+
+
+annotated_cache = AnnotatedRenderCache(ANNOTATED_CACHE_MAX_BYTES, ANNOTATE_QUEUE_LIMIT)
+
+
+def schedule_annotated_render(scan_id: str):
+    """Render the default annotated image in the background after inference"""
+    if ANNOTATE_EAGERLY:
+        annotated_cache.render_in_background(scan_id)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against a strong ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[tuple]:
+    """
+    Parse a single-range "bytes=" Range header
+
+    Returns:
+        (start, end) inclusive, or None if the header should be ignored
+
+    Raises:
+        ValueError if the range is not satisfiable
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None  # Only single byte ranges are supported; serve the full body
+
+    start_text, separator, end_text = ranges.strip().partition("-")
+    start_text, end_text = start_text.strip(), end_text.strip()
+    if not separator or not (start_text or end_text) or \
+            (start_text and not start_text.isdigit()) or (end_text and not end_text.isdigit()):
+        return None  # Malformed ranges are ignored
+
+    if not start_text:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(start_text)
+    end = min(int(end_text), size - 1) if end_text else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def image_bytes_response(request: Request, content: bytes, media_type: str, etag: str) -> Response:
+    """Serve immutable image bytes with ETag, Cache-Control and Range support"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(range_header, len(content))
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{len(content)}"
+            return Response(status_code=416, headers=headers)
 
-        color = color_map.get(class_name, (0, 255, 255))
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return Response(content=content[start:end + 1], status_code=206,
+                            media_type=media_type, headers=headers)
 
-        # Draw bounding box (thicker for detections)
-        cv2.rectangle(annotated, (x, y), (x + w, y + h), color, 3)
+    return Response(content=content, media_type=media_type, headers=headers)
 
-        # Draw corner markers for emphasis
-        corner_length = 15
-        # Top-left
-        cv2.line(annotated, (x, y), (x + corner_length, y), color, 4)
-        cv2.line(annotated, (x, y), (x, y + corner_length), color, 4)
-        # Top-right
-        cv2.line(annotated, (x + w, y), (x + w - corner_length, y), color, 4)
-        cv2.line(annotated, (x + w, y), (x + w, y + corner_length), color, 4)
-        # Bottom-left
-        cv2.line(annotated, (x, y + h), (x + corner_length, y + h), color, 4)
-        cv2.line(annotated, (x, y + h), (x, y + h - corner_length), color, 4)
-        # Bottom-right
-        cv2.line(annotated, (x + w, y + h), (x + w - corner_length, y + h), color, 4)
-        cv2.line(annotated, (x + w, y + h), (x + w, y + h - corner_length), color, 4)
 
-        # Draw label background
-        label = f"{class_name}: {confidence:.2f}"
-        (label_w, label_h), baseline = cv2.getTextSize(
-            label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2
-        )
-        cv2.rectangle(
-            annotated,
-            (x, y - label_h - 15),
-            (x + label_w + 10, y),
-            color,
-            -1
-        )
+@asynccontextmanager
+async def inference_slot():
+    """
+    Admit a request into the CPU-bound pipeline or fail fast
 
-        # Draw label text
-        cv2.putText(
-            annotated,
-            label,
-            (x + 5, y - 8),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (255, 255, 255),
-            2
+    Raises a 503 with a Retry-After header when INFERENCE_QUEUE_LIMIT requests
+    are already in flight, instead of letting work pile up behind the pool.
+    """
+    global inference_inflight
+
+    if inference_inflight >= INFERENCE_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy processing other scans. Please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
         )
 
-    # === ADD LEGEND ===
-    legend_height = 100
-    legend = np.zeros((legend_height, annotated.shape[1], 3), dtype=np.uint8)
-    legend.fill(30)  # Dark background
-
-    # Legend text
-    legend_items = [
-        ("Edges: Cyan", (0, 255, 255)),
-        ("Contours: Purple (circular) / Blue (irregular)", (255, 100, 255)),
-        ("Detections: Colored boxes with corners", (255, 255, 255))
-    ]
+    inference_inflight += 1
+    try:
+        yield
+    finally:
+        inference_inflight -= 1
 
-    y_offset = 25
-    for i, (text, color) in enumerate(legend_items):
-        cv2.putText(legend, text, (10, y_offset + i * 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
 
-    # Combine image with legend
-    annotated = np.vstack([annotated, legend])
+async def run_in_pool(func, *args, executor: Optional[ThreadPoolExecutor] = None):
+    """Run a blocking function in the bounded inference thread pool (or in executor)"""
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the request context so stage timings reach Server-Timing
+    context = contextvars.copy_context()
+    profile = context.get(request_profile)
+    if profile is not None:
+        func = profiled(func, [profile])
+    return await loop.run_in_executor(executor or inference_executor, context.run, func, *args)
 
-    # Convert to JPEG bytes
-    annotated_bgr = cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR)
-    _, buffer = cv2.imencode('.jpg', annotated_bgr, [cv2.IMWRITE_JPEG_QUALITY, 95])
-    return buffer.tobytes()
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse holding an inference_slot for the lifetime of the response
+
+    The slot is released however the response ends: completed, failed,
+    client disconnect, or cancelled before the body was ever iterated.
+    """
+
+    def __init__(self, content, slot: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.slot.aclose()
+
+
+def profiled(func, profiles: list):
+    """Wrap func so the flight recorder samples the thread that runs it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with flight_recorder.attach(profiles):
+            return func(*args, **kwargs)
+    return wrapper
 
 
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup"""
     print("Starting LungEvity YOLOv12 Backend Server...")
-    load_model()
+    if not MODEL_LOADED:  # Pre-forked workers inherit the parent's loaded model
+        start_model_loading()
+    batcher.start()
+    job_workers.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers"""
+    job_workers.stop()
+    batcher.stop()
+    inference_executor.shutdown(wait=False)
+    io_executor.shutdown(wait=False)
+    scan_images.close()
+
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving HTTP"""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before"""
+    ready = MODEL_LOADED and MODEL_STATE == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "modelState": MODEL_STATE,
+            "modelVersion": MODEL_VERSION,
+            "modelName": MODEL_NAME,
+            "warmup": warmup_report,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    )
 
 
 @app.get("/health")
@@ -446,8 +3604,14 @@ async def health_check():
     """Check API health status"""
     return {
         "status": "healthy" if MODEL_LOADED else "unhealthy",
+        "modelState": MODEL_STATE,
         "model": "YOLOv12",
         "modelPath": MODEL_PATH,
+        "modelVersion": MODEL_VERSION,
+        "modelName": MODEL_NAME,
+        "backend": model.serving_name if model is not None else INFERENCE_BACKEND,
+        "configuredBackend": INFERENCE_BACKEND,
+        "quantized": getattr(model, "quantized", False),
         "version": "1.0.0",
         "timestamp": datetime.utcnow().isoformat(),
         "model_loaded": MODEL_LOADED,
@@ -456,9 +3620,14 @@ async def health_check():
 
 
 @app.post("/api/v1/scan/analyze")
-async def analyze_scan(scan: UploadFile = File(...)):
+async def analyze_scan(scan: UploadFile = File(...), window: Optional[str] = Form(None),
+                       window_width: Optional[float] = Form(None),
+                       window_level: Optional[float] = Form(None)):
     """
     Analyze CT scan image for lung cancer detection
+
+    DICOM slices are windowed with the preset in window (minmax, lung,
+    mediastinal) or a custom window_width/window_level in Hounsfield units.
     """
     if not MODEL_LOADED:
         raise HTTPException(
@@ -466,71 +3635,51 @@ async def analyze_scan(scan: UploadFile = File(...)):
             detail="Model not loaded. Please check server configuration."
         )
 
-    # Validate file format
-    allowed_formats = ['.dcm', '.dicom', '.nii', '.jpg', '.jpeg', '.png']
-    file_ext = os.path.splitext(scan.filename)[1].lower()
+    validate_scan_format(scan.filename)
+    window = scan_window(scan.filename, resolve_dicom_window(window, window_width, window_level))
 
-    if file_ext not in allowed_formats:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file format. Supported formats: {', '.join(allowed_formats)}"
-        )
-
-    # Check file size (100MB limit)
-    MAX_SIZE = 100 * 1024 * 1024
-    contents = await scan.read()
-    if len(contents) > MAX_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File size exceeds 100MB limit"
-        )
+    # Hash the spooled upload in chunks and stop at the 100MB limit
+    upload = await receive_upload(scan)
 
     try:
-        # Read and process image
-        start_time = datetime.utcnow()
-        image = read_image(contents, scan.filename)
-
-        # Run YOLO inference
-        results = process_image_with_yolo(image)
-        processing_time = (datetime.utcnow() - start_time).total_seconds()
+        async with inference_slot():
+            start_time = time.perf_counter()
 
-        # Generate scan ID
-        scan_id = generate_scan_id()
+            # The body is only loaded into memory once the request is admitted
+            contents = await run_in_pool(upload.read_bytes)
 
-        # Determine risk level
-        risk_level = get_risk_level(results["confidence"], results["topClass"])
+            # Byte-identical re-uploads skip decode and inference entirely
+            cache_key = ResultCache.make_key(upload.sha256, window)
+            results = result_cache.get(cache_key)
+            if results is not None:
+                note_request(detections=len(results["detections"]))
+                processing_time = time.perf_counter() - start_time
+                response_data = await run_in_pool(
+                    lambda: store_scan_result(
+                        None, results, contents, scan.filename, processing_time,
+                        cache_hit=True, window=window
+                    )
+                )
+                return JSONResponse(content=response_data)
 
-        # Store images for later retrieval
-        scan_images[scan_id] = {
-            "original": image,
-            "detections": results["detections"]
-        }
+            # Read and process image
+            image = await run_in_pool(read_image, contents, scan.filename, window)
+            note_request(scan.filename, image)
 
-        # Create response with full URLs for CORS
-        base_url = "http://localhost:8000"  # Use the backend URL
-        response_data = {
-            "scanId": scan_id,
-            "status": "completed",
-            "uploadTime": datetime.utcnow().isoformat(),
-            "processingTime": round(processing_time, 2),
-            "results": {
-                "detected": results["detected"],
-                "confidence": round(results["confidence"], 3),
-                "riskLevel": risk_level,
-                "topClass": results["topClass"],
-                "detections": results["detections"],
-                "imageUrl": f"{base_url}/api/v1/scan/{scan_id}/image",
-                "annotatedImageUrl": f"{base_url}/api/v1/scan/{scan_id}/annotated"
-            },
-            "metadata": {
-                "imageSize": results["imageSize"],
-                "fileSize": len(contents),
-                "format": file_ext.upper().replace('.', '')
-            }
-        }
+            # Run YOLO inference (batched with concurrent requests)
+            results = await batcher.infer(image)
+            note_request(detections=len(results["detections"]))
+            # Keyed by the version that produced it, in case a reload swapped models meanwhile
+            result_cache.put(ResultCache.make_key(upload.sha256, window, results["modelVersion"],
+                                                  results["modelBackend"]), results)
+            processing_time = time.perf_counter() - start_time
 
-        # Store in database
-        scans_db[scan_id] = response_data
+        # Storing may spill colder images to disk, so keep it off the event loop
+        response_data = await run_in_pool(
+            lambda: store_scan_result(
+                image, results, contents, scan.filename, processing_time, window=window
+            )
+        )
 
         return JSONResponse(content=response_data)
 
@@ -552,30 +3701,57 @@ async def get_scan_result(scan_id: str):
 
 
 @app.get("/api/v1/scan/{scan_id}/image")
-async def get_scan_image(scan_id: str):
-    """Get original scan image"""
+async def get_scan_image(scan_id: str, request: Request):
+    """
+    Get original scan image
+
+    Supports conditional (If-None-Match) and single byte-range requests.
+    """
     if scan_id not in scan_images:
         raise HTTPException(status_code=404, detail="Scan image not found")
 
-    image = scan_images[scan_id]["original"]
-    image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-    _, buffer = cv2.imencode('.jpg', image_bgr)
+    etag = '"' + hashlib.sha256(f"{scan_id}:original".encode()).hexdigest()[:32] + '"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL})
 
-    return Response(content=buffer.tobytes(), media_type="image/jpeg")
+    # Served as uploaded (or as the PNG encoded once at ingest), never re-encoded
+    try:
+        content, media_type = await run_in_pool(scan_images.get_encoded, scan_id)
+    except KeyError:  # Evicted after the check above
+        raise HTTPException(status_code=404, detail="Scan image not found")
+
+    return image_bytes_response(request, content, media_type, etag)
 
 
 @app.get("/api/v1/scan/{scan_id}/annotated")
-async def get_annotated_image(scan_id: str):
-    """Get annotated scan image with bounding boxes"""
+async def get_annotated_image(scan_id: str, request: Request, edges: bool = True,
+                              contours: bool = True, legend: bool = True):
+    """
+    Get annotated scan image with bounding boxes
+
+    Renders are cached per scan and options; responses carry a strong ETag and
+    conditional requests are answered with 304 without rendering.
+    """
     if scan_id not in scan_images:
         raise HTTPException(status_code=404, detail="Scan image not found")
 
-    image = scan_images[scan_id]["original"]
-    detections = scan_images[scan_id]["detections"]
+    options = (edges, contours, legend)
+    headers = {
+        "ETag": AnnotatedRenderCache.etag(scan_id, options),
+        "Cache-Control": IMAGE_CACHE_CONTROL
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
 
-    annotated_bytes = create_annotated_image(image, detections)
+    annotated_bytes = annotated_cache.get(scan_id, options)
+    if annotated_bytes is None:
+        async with inference_slot():
+            try:
+                annotated_bytes = await run_in_pool(annotated_cache.get_or_render, scan_id, options)
+            except KeyError:  # Evicted after the check above
+                raise HTTPException(status_code=404, detail="Scan image not found")
 
-    return Response(content=annotated_bytes, media_type="image/jpeg")
+    return image_bytes_response(request, annotated_bytes, "image/jpeg", headers["ETag"])
 
 
 @app.get("/api/v1/patient/{patient_id}/scans")
@@ -602,6 +3778,128 @@ async def get_patient_scans(patient_id: str):
     }
 
 
+@app.get("/api/v1/stats/batching")
+async def get_batching_stats():
+    """Get micro-batching queue depth and batch-size histogram"""
+    return batcher.stats()
+
+
+@app.get("/api/v1/stats/images")
+async def get_image_store_stats():
+    """Get scan image store memory and spill usage"""
+    return scan_images.stats()
+
+
+@app.get("/api/v1/stats/annotated")
+async def get_annotated_cache_stats():
+    """Get annotated render cache usage"""
+    return annotated_cache.stats()
+
+
+@app.get("/api/v1/stats/cache")
+async def get_cache_stats():
+    """Get inference result cache hit/miss counters"""
+    return result_cache.stats()
+
+
+@app.get("/api/v1/stats/quantization")
+async def get_quantization_stats():
+    """Get the INT8 accuracy check against the FP32 model (onnx-int8 backend only)"""
+    return {
+        "backend": model.serving_name if model is not None else INFERENCE_BACKEND,
+        "configuredBackend": INFERENCE_BACKEND,
+        "quantized": getattr(model, "quantized", False),
+        "accuracyCheck": getattr(model, "accuracy_report", None)
+    }
+
+
+def require_admin(request: Request):
+    """Require the X-Admin-Token header to match ADMIN_TOKEN; admin endpoints are off without one"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them.")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/api/v1/admin/models")
+async def list_models(request: Request):
+    """List registry versions, the serving model and the last reload"""
+    require_admin(request)
+    return {
+        "registry": MODEL_REGISTRY_DIR,
+        "active": {"modelName": MODEL_NAME, "modelVersion": MODEL_VERSION, "modelPath": MODEL_PATH},
+        "versions": model_registry.list(),
+        "reload": model_reloader.get_status()
+    }
+
+
+@app.post("/api/v1/admin/models/{version}/activate", status_code=202)
+async def activate_model(version: str, request: Request):
+    """
+    Load a registry version in the background, warm it up and swap it in
+
+    The current model keeps serving until the swap; requests already running
+    finish on it. Poll GET /api/v1/admin/models for progress.
+    """
+    require_admin(request)
+    if WORKER_PROCESSES > 1:
+        # A reload only reaches the worker that handles this request
+        raise HTTPException(
+            status_code=409,
+            detail=f"Hot reload is not available with {WORKER_PROCESSES} worker processes. "
+                   f"Restart with ACTIVE_MODEL={version} instead."
+        )
+    try:
+        return model_reloader.start(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version '{version}' not found in registry")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/api/v1/admin/profiler")
+async def get_profiler(request: Request, format: str = "json"):
+    """
+    Dump the flight recorder
+
+    format=json returns the slowest kept requests with stage timings, image
+    details and stack samples; format=collapsed returns the stacks of all kept
+    requests as flamegraph.pl / speedscope input.
+    """
+    require_admin(request)
+    if format == "collapsed":
+        return Response(content=flight_recorder.collapsed(), media_type="text/plain")
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Unsupported format. Supported formats: json, collapsed")
+    return {"profiler": flight_recorder.stats(), "requests": flight_recorder.entries()}
+
+
+@app.post("/api/v1/admin/profiler")
+async def configure_profiler(request: Request, enabled: Optional[bool] = None,
+                             sample_rate: Optional[float] = None, slow_ms: Optional[float] = None,
+                             clear: bool = False):
+    """Enable or disable the flight recorder, change its triggers or clear it"""
+    require_admin(request)
+    flight_recorder.configure(enabled=enabled, sample_rate=sample_rate, slow_ms=slow_ms, clear=clear)
+    return flight_recorder.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: per-stage latency histograms, request counts and store sizes"""
+    gauges = {
+        "lungevity_inference_inflight": ("Requests admitted to the inference pipeline", inference_inflight),
+        "lungevity_batcher_queue_depth": ("Images waiting for the micro-batcher", batcher.stats()["queueDepth"]),
+        "lungevity_scans_db_size": ("Scan results held in scans_db", len(scans_db)),
+        "lungevity_scan_images_size": ("Scans held in the scan image store", len(scan_images)),
+        "lungevity_scan_images_memory_bytes": ("Scan image store bytes held in memory",
+                                               scan_images.stats()["memoryBytes"]),
+        "lungevity_model_loaded": ("1 once the model is loaded and warmed up", int(MODEL_LOADED))
+    }
+    return Response(content=metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/v1/config/thresholds")
 async def get_thresholds():
     """Get detection confidence thresholds"""
@@ -612,57 +3910,386 @@ async def get_thresholds():
     }
 
 
+async def infer_slices(decoders: list):
+    """
+    Decode and infer slices in chunks of BATCH_CHUNK_SIZE
+
+    Slices of a chunk are decoded in parallel by the inference pool while the
+    previous chunk is still in the model, and each chunk is inferred with one
+    batched model call.
+
+    Args:
+        decoders: Callables returning each slice as an RGB image
+
+    Yields:
+        (index, result) per slice in order; result is the exception on failure
+    """
+    chunks = [
+        range(start, min(start + BATCH_CHUNK_SIZE, len(decoders)))
+        for start in range(0, len(decoders), max(1, BATCH_CHUNK_SIZE))
+    ]
+
+    def decode_chunk(chunk):
+        return [asyncio.ensure_future(run_in_pool(decoders[idx])) for idx in chunk]
+
+    pending = decode_chunk(chunks[0]) if chunks else []
+    for chunk_number, chunk in enumerate(chunks):
+        decoded = await asyncio.gather(*pending, return_exceptions=True)
+
+        # Start decoding the next chunk before this one goes to the model
+        if chunk_number + 1 < len(chunks):
+            pending = decode_chunk(chunks[chunk_number + 1])
+
+        images = [image for image in decoded if not isinstance(image, BaseException)]
+        try:
+            inferred = await run_in_pool(process_images_with_yolo, images) if images else []
+        except Exception as e:
+            inferred = [e] * len(images)
+
+        inferred_iter = iter(inferred)
+        for idx, image in zip(chunk, decoded):
+            yield idx, image if isinstance(image, BaseException) else next(inferred_iter)
+
+
+def read_upload(scan: UploadFile, window: str = DEFAULT_DICOM_WINDOW) -> np.ndarray:
+    """Decode a spooled upload (blocking; run it in the inference pool)"""
+    image = read_image(scan.file.read(), scan.filename, window)
+    note_request(scan.filename, image)
+    return image
+
+
+async def analyze_slices(scans: List[UploadFile], window: str = DEFAULT_DICOM_WINDOW):
+    """Analyze uploaded slices with infer_slices, yielding one batch result entry per slice"""
+    decoders = [functools.partial(read_upload, scan, window) for scan in scans]
+    async for idx, result in infer_slices(decoders):
+        if isinstance(result, BaseException):
+            yield {
+                "scanId": None,
+                "sliceNumber": idx + 1,
+                "error": str(result)
+            }
+        else:
+            note_request(detections=len(result["detections"]))
+            yield {
+                "scanId": generate_scan_id(),
+                "sliceNumber": idx + 1,
+                "detected": result["detected"],
+                "confidence": result["confidence"],
+                "riskLevel": get_risk_level(result["confidence"], result["topClass"]),
+                "modelVersion": result["modelVersion"]
+            }
+
+
+class BatchAssessment:
+    """Running overallAssessment for a batch, updated as slice results arrive"""
+
+    def __init__(self, total_slices: int):
+        self.total_slices = total_slices
+        self.detected_slices = 0
+        self.max_confidence = 0
+
+    def add(self, result: dict):
+        if result.get("detected", False):
+            self.detected_slices += 1
+        self.max_confidence = max(self.max_confidence, result.get("confidence", 0))
+
+    def to_dict(self) -> dict:
+        return {
+            "maxConfidence": self.max_confidence,
+            "riskLevel": get_risk_level(self.max_confidence, "unknown"),
+            "detectedSlices": self.detected_slices,
+            "totalSlices": self.total_slices
+        }
+
+
+def format_stream_event(event: str, payload: dict, stream_format: str) -> str:
+    """Encode a progress event as an NDJSON line or a Server-Sent Event"""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"type": event, **payload}) + "\n"
+
+
 @app.post("/api/v1/scan/batch-analyze")
-async def batch_analyze(scans: List[UploadFile] = File(...)):
-    """Analyze multiple CT scan slices"""
+async def batch_analyze(scans: List[UploadFile] = File(...), stream: Optional[str] = None,
+                        window: Optional[str] = Form(None),
+                        window_width: Optional[float] = Form(None),
+                        window_level: Optional[float] = Form(None)):
+    """
+    Analyze multiple CT scan slices
+
+    Pass stream=ndjson or stream=sse to receive each slice result as soon as it
+    is ready, followed by a final "complete" event with the full batch response.
+    DICOM windowing works as in /api/v1/scan/analyze and applies to every slice.
+    """
     if not MODEL_LOADED:
         raise HTTPException(
             status_code=503,
             detail="Model not loaded. Please check server configuration."
         )
 
+    if stream not in (None, "ndjson", "sse"):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported stream format. Supported formats: ndjson, sse"
+        )
+
+    window = resolve_dicom_window(window, window_width, window_level)
     batch_id = f"batch_{uuid.uuid4().hex[:12]}"
-    results = []
+    assessment = BatchAssessment(len(scans))
 
-    for idx, scan in enumerate(scans):
-        contents = await scan.read()
-        try:
-            image = read_image(contents, scan.filename)
-            result = process_image_with_yolo(image)
+    def batch_response(results: List[dict]) -> dict:
+        return {
+            "batchId": batch_id,
+            "totalScans": len(scans),
+            "completedScans": len(results),
+            "status": "completed",
+            "results": results,
+            "overallAssessment": assessment.to_dict(),
+            "window": dicom_window_metadata(window)
+        }
 
-            results.append({
-                "scanId": generate_scan_id(),
-                "sliceNumber": idx + 1,
-                "detected": result["detected"],
-                "confidence": result["confidence"],
-                "riskLevel": get_risk_level(result["confidence"], result["topClass"])
-            })
-        except Exception as e:
-            results.append({
-                "scanId": None,
-                "sliceNumber": idx + 1,
-                "error": str(e)
-            })
+    if stream is None:
+        results = []
+        async with inference_slot():
+            async for result in analyze_slices(scans, window):
+                results.append(result)
+                assessment.add(result)
+        return batch_response(results)
+
+    async def event_stream():
+        results = []
+        async for result in analyze_slices(scans, window):
+            results.append(result)
+            assessment.add(result)
+            yield format_stream_event("slice", {
+                "batchId": batch_id,
+                "completedScans": len(results),
+                "totalScans": len(scans),
+                "result": result,
+                "overallAssessment": assessment.to_dict()
+            }, stream)
+        yield format_stream_event("complete", batch_response(results), stream)
+
+    media_type = "text/event-stream" if stream == "sse" else "application/x-ndjson"
+
+    # Admit the request before the response starts so a busy server can still 503;
+    # the response releases the slot on every exit path
+    slot = AsyncExitStack()
+    await slot.enter_async_context(inference_slot())
+    return AdmittedStreamingResponse(
+        event_stream(),
+        slot,
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    # Calculate overall assessment
-    detected_slices = sum(1 for r in results if r.get("detected", False))
-    max_confidence = max([r.get("confidence", 0) for r in results], default=0)
+
+def summarize_volume(slices: List[dict]) -> dict:
+    """
+    Volume-level summary of per-slice results
+
+    Args:
+        slices: Per-slice entries from volume_analyze, in slice order
+
+    Returns:
+        Summary with the most suspicious slice, detected slice ranges and
+        the number of slices each class was detected on
+    """
+    analyzed = [entry for entry in slices if "error" not in entry]
+    detected = [entry for entry in analyzed if entry["detected"]]
+
+    ranges = []
+    for entry in detected:
+        if ranges and ranges[-1][1] == entry["sliceNumber"] - 1:
+            ranges[-1][1] = entry["sliceNumber"]
+        else:
+            ranges.append([entry["sliceNumber"], entry["sliceNumber"]])
+
+    class_counts = Counter()
+    for entry in analyzed:
+        class_counts.update({d["class"] for d in entry["detections"] if d["class"] != "normal"})
+
+    top = max(detected or analyzed, key=lambda entry: entry["confidence"], default=None)
+    top_class = top["topClass"] if detected else "normal"
+    max_confidence = top["confidence"] if top else 0
+    return {
+        "totalSlices": len(slices),
+        "analyzedSlices": len(analyzed),
+        "detectedSlices": len(detected),
+        "detected": bool(detected),
+        "maxConfidence": max_confidence,
+        "topClass": top_class,
+        "riskLevel": get_risk_level(max_confidence, top_class),
+        "mostSuspiciousSlice": top["sliceNumber"] if detected else None,
+        "detectedRanges": ranges,
+        "classCounts": dict(class_counts)
+    }
+
+
+@app.post("/api/v1/scan/volume-analyze")
+async def volume_analyze(scans: List[UploadFile] = File(...), window: Optional[str] = Form(None),
+                         window_width: Optional[float] = Form(None),
+                         window_level: Optional[float] = Form(None)):
+    """
+    Analyze a whole DICOM series or NIfTI volume in one request
+
+    Accepts the slices of a series as multipart files, zip archives of a
+    series, multi-frame DICOM objects, or a single .nii/.nii.gz volume.
+    DICOM slices are ordered by position using header-only reads; NIfTI
+    volumes are memory-mapped and their axial slices extracted lazily. Slices
+    are then decoded and inferred as one batched pipeline. Returns per-slice
+    detections plus a volume summary.
+    """
+    if not MODEL_LOADED:
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded. Please check server configuration."
+        )
+
+    for scan in scans:
+        if scan_extension(scan.filename) not in VOLUME_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail="Unsupported file format. Supported formats: .dcm, .dicom, .zip, .nii, .nii.gz"
+            )
+
+    is_nifti = any(scan_extension(scan.filename) in NIFTI_FORMATS for scan in scans)
+    if is_nifti and len(scans) > 1:
+        raise HTTPException(status_code=400, detail="Upload a NIfTI volume on its own")
+    if is_nifti and not NIFTI_SUPPORT:
+        raise HTTPException(
+            status_code=400,
+            detail="NIfTI support not available. Please install nibabel."
+        )
+    if not is_nifti and not DICOM_SUPPORT:
+        raise HTTPException(
+            status_code=400,
+            detail="DICOM support not available. Please install pydicom."
+        )
+    window = resolve_dicom_window(window, window_width, window_level)
+
+    nifti_volume = None
+    try:
+        async with inference_slot():
+            start_time = time.perf_counter()
+            if is_nifti:
+                # Copied straight from the spooled upload, never held in memory
+                try:
+                    nifti_volume = await run_in_pool(
+                        NiftiVolume.from_upload, scans[0].file, scans[0].filename
+                    )
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Error reading NIfTI file: {str(e)}")
+                volume, sorted_by = nifti_volume.slice_entries(scans[0].filename, window), "position"
+            else:
+                read_start = time.perf_counter()
+                uploads = [(scan.filename, await scan.read()) for scan in scans]
+                record_stage("upload_read", time.perf_counter() - read_start)
+                volume, sorted_by = await run_in_pool(collect_dicom_volume, uploads, window)
+                del uploads
+
+            slices = []
+            async for idx, result in infer_slices([item["decode"] for item in volume]):
+                entry = {
+                    "sliceNumber": idx + 1,
+                    "source": volume[idx]["source"],
+                    "frame": volume[idx]["frame"],
+                    "instanceNumber": volume[idx]["instanceNumber"],
+                    "position": volume[idx]["position"]
+                }
+                if isinstance(result, BaseException):
+                    entry["error"] = str(result.detail if isinstance(result, HTTPException) else result)
+                else:
+                    entry.update(
+                        detected=result["detected"],
+                        confidence=result["confidence"],
+                        topClass=result["topClass"],
+                        riskLevel=get_risk_level(result["confidence"], result["topClass"]),
+                        detections=result["detections"],
+                        modelVersion=result["modelVersion"]
+                    )
+                slices.append(entry)
+            processing_time = time.perf_counter() - start_time
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error processing volume: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        if nifti_volume is not None:
+            nifti_volume.close()
 
     return {
-        "batchId": batch_id,
-        "totalScans": len(scans),
-        "completedScans": len(results),
+        "volumeId": f"volume_{uuid.uuid4().hex[:12]}",
         "status": "completed",
-        "results": results,
-        "overallAssessment": {
-            "maxConfidence": max_confidence,
-            "riskLevel": get_risk_level(max_confidence, "unknown"),
-            "detectedSlices": detected_slices,
-            "totalSlices": len(scans)
-        }
+        "processingTime": round(processing_time, 2),
+        "sortedBy": sorted_by,
+        "window": dicom_window_metadata(window),
+        "summary": summarize_volume(slices),
+        "slices": slices
     }
 
 
+@app.post("/api/v1/jobs", status_code=202)
+async def submit_job(scan: UploadFile = File(...), priority: int = Form(0),
+                     window: Optional[str] = Form(None),
+                     window_width: Optional[float] = Form(None),
+                     window_level: Optional[float] = Form(None)):
+    """
+    Queue a CT scan for background analysis
+
+    Returns immediately with a job ID. Poll GET /api/v1/jobs/{job_id} (optionally
+    with ?wait=<seconds> to block until the job finishes) for the scan result.
+    """
+    if not MODEL_LOADED:
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded. Please check server configuration."
+        )
+
+    validate_scan_format(scan.filename)
+    window = scan_window(scan.filename, resolve_dicom_window(window, window_width, window_level))
+    upload = await receive_upload(scan)
+    contents = await run_in_pool(upload.read_bytes, executor=io_executor)
+
+    try:
+        job = await run_in_pool(job_queue.submit, scan.filename, contents, priority, window,
+                                executor=io_executor)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full. Please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+    job["statusUrl"] = f"/api/v1/jobs/{job['jobId']}"
+    return job
+
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Get job status, waiting up to `wait` seconds for it to finish"""
+    deadline = time.monotonic() + min(max(wait, 0), JOB_MAX_WAIT_SECONDS)
+    while True:
+        job = await run_in_pool(job_queue.get, job_id, executor=io_executor)
+        if job is None:  # Unknown, or purged while waiting
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in JOB_TERMINAL_STATES or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.1)
+
+
+@app.delete("/api/v1/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job (a running job's result is discarded)"""
+    job = await run_in_pool(job_queue.cancel, job_id, executor=io_executor)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
 if __name__ == "__main__":
     import uvicorn
     import os
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark for DICOM decoding in backend_server.read_dicom_image
+
+Compares the original path (temporary file + float64 min-max normalization)
+with the in-memory, lookup-table based read_dicom_image on synthetic CT-like
+DICOM slices. Reports latency and peak traced memory per slice, and checks
+that both paths produce identical pixels.
+
+Usage:
+    python benchmarks/bench_dicom.py
+    python benchmarks/bench_dicom.py --sizes 512 1024 --repeat 20
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backend_server  # noqa: E402
+
+
+def legacy_read_dicom_image(file_bytes):
+    """DICOM decoding as originally written in backend_server.py"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.dcm') as tmp_file:
+        tmp_file.write(file_bytes)
+        tmp_path = tmp_file.name
+
+    ds = pydicom.dcmread(tmp_path)
+    img = ds.pixel_array
+    os.unlink(tmp_path)
+
+    img = ((img - img.min()) / (img.max() - img.min()) * 255).astype(np.uint8)
+
+    if len(img.shape) == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    return img
+
+
+def make_ct_slice(size, signed, seed=0):
+    """Synthetic CT slice in Hounsfield-like stored values: air, body, lungs, bone"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size]
+    center = size / 2
+    body = ((xx - center) / (0.45 * size)) ** 2 + ((yy - center) / (0.35 * size)) ** 2 <= 1
+    lungs = (((np.abs(xx - center) - 0.18 * size) / (0.12 * size)) ** 2 +
+             ((yy - center) / (0.22 * size)) ** 2) <= 1
+    spine = ((xx - center) ** 2 + (yy - 0.72 * size) ** 2) <= (0.04 * size) ** 2
+
+    hu = np.full((size, size), -1000.0)
+    hu[body] = 40
+    hu[lungs] = -850
+    hu[spine] = 700
+    hu += rng.normal(0, 20, hu.shape)
+
+    if signed:
+        return np.clip(hu, -1024, 3071).astype(np.int16), 0
+    return np.clip(hu + 1024, 0, 4095).astype(np.uint16), -1024
+
+
+def make_dicom_bytes(pixels, intercept):
+    """Encode a 2D pixel array as a minimal CT DICOM file"""
+    meta = FileMetaDataset()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.preamble = b"\0" * 128
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16 if pixels.dtype == np.int16 else 12
+    ds.HighBit = ds.BitsStored - 1
+    ds.PixelRepresentation = 1 if pixels.dtype == np.int16 else 0
+    ds.RescaleSlope = 1
+    ds.RescaleIntercept = intercept
+    ds.PixelData = pixels.tobytes()
+
+    buffer = io.BytesIO()
+    # write_like_original=False writes the preamble and file meta on pydicom 2.4 and 3.x alike
+    ds.save_as(buffer, write_like_original=False)
+    return buffer.getvalue()
+
+
+def measure(func, data, repeat):
+    """Mean latency (ms) over repeat calls and peak traced memory (MB) of one call"""
+    func(data)  # Warm up lookup tables and imports
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(data)
+    latency_ms = (time.perf_counter() - start) / repeat * 1000
+
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latency_ms, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DICOM decoding")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'slice':>14} {'legacy ms':>10} {'new ms':>8} {'legacy MB':>10} {'new MB':>8}")
+    for size in args.sizes:
+        for signed in (False, True):
+            pixels, intercept = make_ct_slice(size, signed)
+            data = make_dicom_bytes(pixels, intercept)
+
+            if not np.array_equal(legacy_read_dicom_image(data), backend_server.read_dicom_image(data)):
+                print(f"Output mismatch for {size}x{size} {'int16' if signed else 'uint16'}")
+                sys.exit(1)
+
+            legacy_ms, legacy_mb = measure(legacy_read_dicom_image, data, args.repeat)
+            new_ms, new_mb = measure(backend_server.read_dicom_image, data, args.repeat)
+            label = f"{size}x{size} {'i16' if signed else 'u16'}"
+            print(f"{label:>14} {legacy_ms:>10.2f} {new_ms:>8.2f} {legacy_mb:>10.1f} {new_mb:>8.1f}")
+
+    # Constant slices used to divide by zero; they now decode to black
+    constant = make_dicom_bytes(np.full((64, 64), 1000, dtype=np.uint16), -1024)
+    assert not backend_server.read_dicom_image(constant).any()
+
+
+if __name__ == "__main__":
+    main()
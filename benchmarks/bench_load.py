@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the scan API
+
+Starts backend_server locally (via start_backend.py) or targets a running
+server, and drives /api/v1/scan/analyze, /api/v1/scan/batch-analyze,
+/api/v1/scan/{id}/image and /api/v1/scan/{id}/annotated with closed-loop
+clients at each concurrency level. Uploads are synthetic CT-like PNG, JPEG
+and DICOM slices in several sizes. Every upload is made byte-unique so the
+result cache is not hit, unless --cache-hits is passed.
+
+Reports throughput, p50/p95/p99 latency, error rate and status codes per
+scenario and concurrency, plus the server's RSS (all worker processes) over
+time, as JSON for comparing builds and configurations. With several workers,
+scans live in the worker that analyzed them, so /image and /annotated
+requests landing on another worker count as 404 errors.
+
+Usage:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --concurrency 1 4 16 --duration 30 --output load.json
+    python benchmarks/bench_load.py --workers 2 --env INFERENCE_BACKEND=onnx
+    python benchmarks/bench_load.py --env INFERENCE_BACKEND=stub   # No best.pt needed
+    python benchmarks/bench_load.py --url http://localhost:8000 --server-pid 1234
+"""
+
+import argparse
+import http.client
+import io
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+import pydicom
+
+from bench_dicom import make_ct_slice, make_dicom_bytes
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SCENARIOS = ("analyze", "batch", "image", "annotated")
+FORMATS = ("png", "jpg", "dcm")
+MARKER = b"LOADTEST"
+COUNTER_DIGITS = 16
+
+
+def make_fixture(size: int, fmt: str, seed: int) -> bytes:
+    """Synthetic CT slice encoded as PNG, JPEG or DICOM, carrying a patchable counter"""
+    hu, intercept = make_ct_slice(size, signed=True, seed=seed)
+    if fmt == "dcm":
+        ds = pydicom.dcmread(io.BytesIO(make_dicom_bytes(hu, intercept)))
+        ds.SeriesDescription = (MARKER + b"0" * COUNTER_DIGITS).decode()
+        buffer = io.BytesIO()
+        ds.save_as(buffer, write_like_original=False)  # pydicom 2.4 and 3.x
+        return buffer.getvalue()
+
+    # Lung window, as a viewer export would look
+    gray = np.clip((hu.astype(np.float32) + 1350) / 1500 * 255, 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode("." + fmt, gray)
+    if not ok:
+        raise RuntimeError(f"Could not encode {fmt}")
+    # PNG/JPEG decoders stop at the end marker, so a trailer is ignored
+    return encoded.tobytes() + MARKER + b"0" * COUNTER_DIGITS
+
+
+class Fixtures:
+    """Upload payloads cycled round-robin, made byte-unique per request"""
+
+    def __init__(self, sizes: list, formats: list, unique: bool):
+        self.items = [(f"slice_{size}.{fmt}", make_fixture(size, fmt, seed=size), fmt)
+                      for size in sizes for fmt in formats]
+        self.unique = unique
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next(self) -> tuple:
+        with self._lock:
+            n = next(self._counter)
+        filename, data, _ = self.items[n % len(self.items)]
+        if self.unique:
+            data = data.replace(MARKER + b"0" * COUNTER_DIGITS,
+                                MARKER + str(n).zfill(COUNTER_DIGITS).encode(), 1)
+        return filename, data
+
+
+def multipart_body(field: str, files: list) -> tuple:
+    """Encode (filename, bytes) pairs as multipart/form-data under one field name"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode()
+        )
+        parts.append(data)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """One keep-alive connection per load-generating thread"""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method: str, path: str, body: bytes = None, headers: dict = None) -> tuple:
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except Exception:
+            self.conn.close()
+            self.conn = None
+            raise
+
+
+def process_tree(pid: int) -> list:
+    """pid and all its descendants (Linux /proc)"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class RssSampler:
+    """Samples the RSS of the server process tree in the background"""
+
+    def __init__(self, pid: int, interval: float):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.phase = "startup"
+        self._start = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            processes = {str(pid): round(rss_mb(pid), 1) for pid in process_tree(self.pid)}
+            self.samples.append({
+                "t": round(time.perf_counter() - self._start, 2),
+                "phase": self.phase,
+                "totalMB": round(sum(processes.values()), 1),
+                "processes": processes
+            })
+            self._stop.wait(self.interval)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return float(np.percentile(sorted_values, q))
+
+
+def run_scenario(url: str, scenario: str, concurrency: int, duration: float, args,
+                 fixtures: Fixtures, scan_ids: list) -> dict:
+    """Closed-loop load: each client sends its next request as soon as the last one returns"""
+    deadline = time.perf_counter() + duration
+    latencies, statuses, errors = [], Counter(), Counter()
+    lock = threading.Lock()
+    option_sets = itertools.cycle(
+        f"?edges={e}&contours={c}&legend={g}"
+        for e in ("true", "false") for c in ("true", "false") for g in ("true", "false")
+    )
+
+    def next_request() -> tuple:
+        if scenario == "analyze":
+            body, content_type = multipart_body("scan", [fixtures.next()])
+            return "POST", "/api/v1/scan/analyze", body, {"Content-Type": content_type}
+        if scenario == "batch":
+            files = [fixtures.next() for _ in range(args.batch_size)]
+            body, content_type = multipart_body("scans", files)
+            return "POST", "/api/v1/scan/batch-analyze", body, {"Content-Type": content_type}
+        with lock:
+            scan_id = scan_ids[len(latencies) % len(scan_ids)]
+            options = next(option_sets) if scenario == "annotated" else ""
+        return "GET", f"/api/v1/scan/{scan_id}/{scenario}{options}", None, {}
+
+    def client_loop():
+        client = Client(url, args.timeout)
+        while time.perf_counter() < deadline:
+            method, path, body, headers = next_request()
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+                error = None if status < 400 else f"HTTP {status}"
+            except Exception as e:
+                status, error = None, type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] += 1
+                if error:
+                    errors[error] += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client_loop) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - wall_start
+
+    ms = sorted(value * 1000 for value in latencies)
+    total = len(ms)
+    images_per_request = args.batch_size if scenario == "batch" else 1
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "durationSeconds": round(wall, 2),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "errorRate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughputRps": round(total / wall, 2),
+        "imagesPerSecond": round(total * images_per_request / wall, 2),
+        "latencyMs": {
+            "mean": round(sum(ms) / total, 2) if total else 0.0,
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+            "max": round(ms[-1], 2) if ms else 0.0
+        },
+        "statusCodes": dict(statuses),
+        "errorTypes": dict(errors)
+    }
+
+
+def seed_scans(url: str, fixtures: Fixtures, count: int, timeout: float) -> list:
+    """Analyze a few slices so the /image and /annotated scenarios have scans to fetch"""
+    client = Client(url, timeout)
+    scan_ids = []
+    for _ in range(count):
+        body, content_type = multipart_body("scan", [fixtures.next()])
+        status, payload = client.request("POST", "/api/v1/scan/analyze", body, {"Content-Type": content_type})
+        if status == 200:
+            scan_ids.append(json.loads(payload)["scanId"])
+    return scan_ids
+
+
+def start_server(args) -> tuple:
+    """Start start_backend.py on args.port and wait until /health/ready answers 200"""
+    env = dict(os.environ, PORT=str(args.port))
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        env[key] = value
+    command = [sys.executable, "start_backend.py"]
+    if args.workers:
+        command += ["--workers", args.workers]
+
+    log = tempfile.NamedTemporaryFile(prefix="bench_load_server_", suffix=".log", delete=False)
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.perf_counter() + args.startup_timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}; see {log.name}")
+        try:
+            status, _ = Client(url, 2).request("GET", "/health/ready")
+            if status == 200:
+                return process, url, log.name
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError(f"Server not ready after {args.startup_timeout}s; see {log.name}")
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the scan API")
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, for RSS sampling")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", help="--workers passed to start_backend.py (N or auto)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment for the started server, e.g. INFERENCE_BACKEND=onnx")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario and concurrency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--batch-size", type=int, default=8, help="Slices per batch-analyze request")
+    parser.add_argument("--seed-scans", type=int, default=16, help="Scans created for /image and /annotated")
+    parser.add_argument("--cache-hits", action="store_true", help="Re-send identical bytes (measures the result cache)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    fixtures = Fixtures(args.sizes, args.formats, unique=not args.cache_hits)
+    process, log_path = None, None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        print(f"Starting server on port {args.port}...", file=sys.stderr)
+        process, url, log_path = start_server(args)
+
+    server_pid = process.pid if process else args.server_pid
+    sampler = RssSampler(server_pid, args.rss_interval) if server_pid else None
+    if sampler:
+        sampler.start()
+
+    runs = []
+    try:
+        status, health = Client(url, args.timeout).request("GET", "/health")
+        scan_ids = []
+        if {"image", "annotated"} & set(args.scenarios):
+            scan_ids = seed_scans(url, fixtures, args.seed_scans, args.timeout)
+            if not scan_ids:
+                raise RuntimeError("Could not create scans for the image/annotated scenarios")
+
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                if sampler:
+                    sampler.phase = f"{scenario}@{concurrency}"
+                print(f"{scenario} at concurrency {concurrency} for {args.duration:g}s...", file=sys.stderr)
+                result = run_scenario(url, scenario, concurrency, args.duration, args, fixtures, scan_ids)
+                print(f"  {result['throughputRps']} req/s, p50 {result['latencyMs']['p50']} ms, "
+                      f"p99 {result['latencyMs']['p99']} ms, errors {result['errorRate']:.2%}", file=sys.stderr)
+                runs.append(result)
+    finally:
+        if sampler:
+            sampler.stop()
+        if process:
+            stop_server(process)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "url": url,
+            "workers": args.workers,
+            "env": args.env,
+            "durationSeconds": args.duration,
+            "sizes": args.sizes,
+            "formats": args.formats,
+            "batchSize": args.batch_size,
+            "cacheHits": args.cache_hits,
+            "serverLog": log_path
+        },
+        "server": json.loads(health) if status == 200 else None,
+        "runs": runs,
+        "rss": {
+            "peakMB": max((sample["totalMB"] for sample in sampler.samples), default=0.0),
+            "samples": sampler.samples
+        } if sampler else None
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the scan pipeline hot functions, with a regression gate
+
+Times read_image (PNG, JPEG, DICOM), read_dicom_image, detection
+post-processing (_detections_from_result) and create_annotated_image from
+backend_server.py, plus is_likely_lung_ct, preprocess_image and
+analyze_contours from copy_of_testing_si_model.py. The inputs are fixed
+synthetic CT slices at 512x512, 1024x1024 and 2048x2048.
+
+Each case is calibrated so a round lasts at least --min-time, then timed
+over --rounds rounds; the median is compared with the baseline file. Every
+run also checks output equivalence: read_image and post-processing are
+compared with reference implementations (plain OpenCV for PNG/JPEG, pydicom
+pixel_array with rescale and window applied in NumPy for DICOM), and every
+case's output digest must match the one in the baseline. The run exits non-zero on a mismatch, or
+if any median is more than --tolerance slower than its baseline.
+
+Baselines depend on the machine and library versions, so record one on the
+machine that runs the comparison.
+
+Usage:
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 512 --filter read_image --tolerance 0.1
+"""
+
+import argparse
+import ast
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+import pydicom
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backend_server  # noqa: E402
+from bench_dicom import make_ct_slice, make_dicom_bytes  # noqa: E402
+from bench_postprocess import NAMES, legacy_detections_from_result, make_result  # noqa: E402
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+NOTEBOOK_PATH = os.path.join(REPO_ROOT, "copy_of_testing_si_model.py")
+NOTEBOOK_FUNCTIONS = ("is_likely_lung_ct", "preprocess_image", "analyze_contours")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_pipeline.json")
+NUM_BOXES = 50
+
+
+def load_notebook_functions(path: str, names: tuple) -> dict:
+    """
+    Load functions from the Colab notebook export without running it
+
+    The notebook cannot be imported (shell escapes, google.colab, top-level
+    training code), so only the requested function definitions are executed.
+    """
+    with open(path) as f:
+        lines = [line for line in f.read().splitlines() if not line.lstrip().startswith("!")]
+    tree = ast.parse("\n".join(lines))
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in names]
+    namespace = {"np": np, "cv2": cv2}
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), path, "exec"), namespace)
+    return {name: namespace[name] for name in names}
+
+
+def digest(value) -> str:
+    """Stable hash of a function output (arrays, bytes, dicts, lists, numbers)"""
+    h = hashlib.sha256()
+
+    def feed(v):
+        if isinstance(v, np.ndarray):
+            h.update(f"{v.dtype.str}{v.shape}".encode())
+            h.update(np.ascontiguousarray(v).tobytes())
+        elif isinstance(v, (bytes, bytearray)):
+            h.update(bytes(v))
+        elif isinstance(v, dict):
+            for key in sorted(v, key=str):
+                feed(key)
+                feed(v[key])
+        elif isinstance(v, (list, tuple)):
+            h.update(b"[")
+            for item in v:
+                feed(item)
+            h.update(b"]")
+        elif isinstance(v, (float, np.floating)):
+            h.update(repr(round(float(v), 6)).encode())
+        else:
+            h.update(repr(v).encode())
+
+    feed(value)
+    return h.hexdigest()[:16]
+
+
+def make_inputs(size: int) -> dict:
+    """Fixed synthetic inputs for one image size"""
+    hu, intercept = make_ct_slice(size, signed=False, seed=size)
+    gray = np.clip((hu.astype(np.float32) + intercept + 1350) / 1500 * 255, 0, 255).astype(np.uint8)
+    rgb = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+    result, _ = make_result(NUM_BOXES, size=size, seed=size)
+    return {
+        "png": cv2.imencode(".png", gray)[1].tobytes(),
+        "jpeg": cv2.imencode(".jpg", gray)[1].tobytes(),
+        "dicom": make_dicom_bytes(hu, intercept),
+        "rgb": rgb,
+        "result": result,
+        "detections": backend_server._detections_from_result(result, rgb, NAMES)["detections"]
+    }
+
+
+def reference_decode(data: bytes) -> np.ndarray:
+    """PNG/JPEG decoding as plain OpenCV does it"""
+    return cv2.cvtColor(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def reference_read_dicom(data: bytes, window: str = backend_server.DEFAULT_DICOM_WINDOW) -> np.ndarray:
+    """
+    DICOM decoding written directly against pydicom and NumPy
+
+    minmax stretches the stored values to 0-255 and truncates; other windows
+    convert to Hounsfield units with the rescale slope/intercept, window,
+    clip and round. All in float64, with no lookup tables.
+    """
+    ds = pydicom.dcmread(io.BytesIO(data))
+    pixels = ds.pixel_array.astype(np.float64)
+    if window == "minmax":
+        lo, hi = pixels.min(), pixels.max()
+        gray = np.zeros_like(pixels) if hi == lo else (pixels - lo) / (hi - lo) * 255
+        gray = np.clip(gray, 0, 255).astype(np.uint8)
+    else:
+        if window in backend_server.DICOM_WINDOW_PRESETS:
+            width, level = backend_server.DICOM_WINDOW_PRESETS[window]
+        else:
+            width, level = (float(value) for value in window.split(":")[1:])
+        hu = pixels * float(ds.RescaleSlope) + float(ds.RescaleIntercept)
+        gray = np.rint(np.clip((hu - (level - width / 2)) / width * 255, 0, 255)).astype(np.uint8)
+    return np.repeat(gray[..., np.newaxis], 3, axis=2)
+
+
+def build_cases(size: int, notebook: dict) -> list:
+    """(name, callable, reference output or None) for one image size"""
+    inputs = make_inputs(size)
+    rgb, result = inputs["rgb"], inputs["result"]
+    return [
+        (f"read_image[png-{size}]", lambda: backend_server.read_image(inputs["png"], "slice.png"),
+         reference_decode(inputs["png"])),
+        (f"read_image[jpeg-{size}]", lambda: backend_server.read_image(inputs["jpeg"], "slice.jpg"),
+         reference_decode(inputs["jpeg"])),
+        (f"read_image[dicom-{size}]", lambda: backend_server.read_image(inputs["dicom"], "slice.dcm"),
+         reference_read_dicom(inputs["dicom"])),
+        (f"read_dicom_image[{size}]", lambda: backend_server.read_dicom_image(inputs["dicom"]),
+         reference_read_dicom(inputs["dicom"])),
+        (f"read_dicom_image[lung-{size}]", lambda: backend_server.read_dicom_image(inputs["dicom"], "lung"),
+         reference_read_dicom(inputs["dicom"], "lung")),
+        (f"postprocess[{NUM_BOXES}boxes-{size}]",
+         lambda: backend_server._detections_from_result(result, rgb, NAMES),
+         legacy_detections_from_result(result, rgb, NAMES)),
+        (f"create_annotated_image[{size}]",
+         lambda: backend_server.create_annotated_image(rgb, inputs["detections"]), None),
+        (f"is_likely_lung_ct[{size}]", lambda: notebook["is_likely_lung_ct"](rgb), None),
+        (f"preprocess_image[{size}]", lambda: notebook["preprocess_image"](rgb), None),
+        (f"analyze_contours[{size}]", lambda: notebook["analyze_contours"](rgb), None)
+    ]
+
+
+def measure(func, rounds: int, min_time: float) -> dict:
+    """Calibrate loops per round to last min_time, then time rounds; seconds per call"""
+    func()  # Warm up caches and lookup tables
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append((time.perf_counter() - start) / loops)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": rounds,
+        "loops": loops
+    }
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark the scan pipeline hot functions")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048])
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed median slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--json", help="Also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline["environment"] != environment():
+                print("Warning: baseline was recorded in a different environment; timings may not compare")
+        else:
+            print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+
+    notebook = load_notebook_functions(NOTEBOOK_PATH, NOTEBOOK_FUNCTIONS)
+    results, failures = {}, []
+
+    print(f"{'case':<34} {'median ms':>10} {'min ms':>9} {'stddev':>8} {'baseline':>9} {'change':>8}")
+    for size in args.sizes:
+        for name, func, reference in build_cases(size, notebook):
+            if args.filter and args.filter not in name:
+                continue
+
+            output = func()
+            if reference is not None and digest(output) != digest(reference):
+                failures.append(f"{name}: output differs from the reference implementation")
+            stats = measure(func, args.rounds, args.min_time)
+            stats["digest"] = digest(output)
+            results[name] = stats
+
+            line = (f"{name:<34} {stats['median'] * 1000:>10.3f} {stats['min'] * 1000:>9.3f} "
+                    f"{stats['stddev'] * 1000:>8.3f}")
+            previous = baseline["results"].get(name) if baseline else None
+            if previous:
+                change = stats["median"] / previous["median"] - 1
+                line += f" {previous['median'] * 1000:>9.3f} {change:>+8.1%}"
+                if change > args.tolerance:
+                    failures.append(f"{name}: {change:+.1%} slower than baseline (tolerance {args.tolerance:.0%})")
+                if stats["digest"] != previous["digest"]:
+                    failures.append(f"{name}: output differs from the baseline")
+            print(line)
+
+    run = {"environment": environment(), "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.save_baseline:
+        if failures:
+            print("\n".join(["", "Not saving baseline:"] + failures))
+            sys.exit(1)
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                # Keep cases that were filtered out of this run
+                run["results"] = {**json.load(f)["results"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if failures:
+        print("\n".join(["", "FAILED:"] + failures))
+        sys.exit(1)
+    if baseline:
+        print("\nAll cases match the baseline within tolerance")
+
+
+if __name__ == "__main__":
+    main()
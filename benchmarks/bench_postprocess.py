@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for YOLO detection post-processing
+
+Compares the original per-box loop (one tensor-to-NumPy conversion per box)
+with the vectorized _detections_from_result in backend_server.py on synthetic
+Ultralytics results, and checks that both produce identical output.
+
+Usage:
+    python benchmarks/bench_postprocess.py
+    python benchmarks/bench_postprocess.py --boxes 10 100 300 --repeat 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backend_server  # noqa: E402
+
+NAMES = {0: "adenocarcinoma", 1: "normal", 2: "squamous_cell_carcinoma"}
+
+
+def legacy_detections_from_result(r, image, names):
+    """Per-box post-processing as originally written in process_image_with_yolo"""
+    height, width = image.shape[:2]
+
+    detections = []
+    max_confidence = 0.0
+    top_class = "normal"
+
+    boxes = r.boxes
+    if boxes is not None and len(boxes) > 0:
+        for box in boxes:
+            cls_id = int(box.cls[0])
+            confidence = float(box.conf[0])
+            class_name = names[cls_id]
+
+            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+
+            if confidence > max_confidence:
+                max_confidence = confidence
+                top_class = class_name
+
+            pixel_width = float(x2 - x1)
+            pixel_height = float(y2 - y1)
+            avg_size_px = (pixel_width + pixel_height) / 2
+            size_mm = float(avg_size_px * 0.5)
+
+            aspect_ratio = float(pixel_width / pixel_height if pixel_height > 0 else 1.0)
+            if 0.8 <= aspect_ratio <= 1.2:
+                shape = "round"
+            elif aspect_ratio > 1.2:
+                shape = "oval"
+            else:
+                shape = "irregular"
+
+            detections.append({
+                "class": class_name,
+                "confidence": round(confidence, 3),
+                "boundingBox": {
+                    "x": int(x1),
+                    "y": int(y1),
+                    "width": int(x2 - x1),
+                    "height": int(y2 - y1)
+                },
+                "characteristics": {
+                    "size_mm": round(size_mm, 1),
+                    "shape": shape,
+                    "density": "solid"
+                }
+            })
+
+    if len(detections) == 0:
+        top_class = "normal"
+        max_confidence = 0.5
+
+    return {
+        "detected": top_class != "normal",
+        "confidence": float(max_confidence),
+        "topClass": top_class,
+        "detections": detections,
+        "imageSize": {"width": int(width), "height": int(height)}
+    }
+
+
+def make_result(num_boxes, size=512, seed=0):
+    """Build a synthetic Ultralytics result with num_boxes random detections"""
+    rng = np.random.default_rng(seed)
+    x1 = rng.uniform(0, size - 80, num_boxes)
+    y1 = rng.uniform(0, size - 80, num_boxes)
+    w = rng.uniform(5, 80, num_boxes)
+    h = rng.uniform(5, 80, num_boxes)
+    conf = rng.uniform(0.25, 0.99, num_boxes)
+    cls = rng.integers(0, len(NAMES), num_boxes)
+    data = np.stack([x1, y1, x1 + w, y1 + h, conf, cls], axis=1).astype(np.float32)
+
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    return Results(image, path="synthetic", names=NAMES, boxes=torch.from_numpy(data)), image
+
+
+def time_call(func, repeat):
+    """Best-of-three mean time per call in milliseconds"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection post-processing")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[1, 10, 50, 100, 300])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'boxes':>6} {'legacy ms':>10} {'vectorized ms':>14} {'speedup':>8}")
+    for num_boxes in args.boxes:
+        result, image = make_result(num_boxes)
+
+        legacy = legacy_detections_from_result(result, image, NAMES)
+        vectorized = backend_server._detections_from_result(result, image, NAMES)
+        if legacy != vectorized:
+            print(f"Output mismatch with {num_boxes} boxes")
+            sys.exit(1)
+
+        legacy_ms = time_call(lambda: legacy_detections_from_result(result, image, NAMES), args.repeat)
+        vectorized_ms = time_call(lambda: backend_server._detections_from_result(result, image, NAMES), args.repeat)
+        print(f"{num_boxes:>6} {legacy_ms:>10.3f} {vectorized_ms:>14.3f} {legacy_ms / vectorized_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed check of the INT8 (onnx-int8) model against FP32 best.pt
+
+Quantizes best.pt with the slices in the calibration folder (cached like the
+server does), runs both models on the held-out folder, and reports
+IoU-matched box agreement, class agreement, top-class agreement, mean
+latency and speedup. Exits non-zero if the accuracy drop exceeds the
+tolerance, i.e. when the server would refuse the quantized model.
+
+Usage:
+    python benchmarks/check_int8.py
+    python benchmarks/check_int8.py --calibration calibration --holdout calibration_holdout --tolerance 0.02
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backend_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check INT8 model accuracy against FP32")
+    parser.add_argument("--weights", default=backend_server.MODEL_PATH)
+    parser.add_argument("--calibration", default=backend_server.QUANT_CALIBRATION_DIR)
+    parser.add_argument("--holdout", default=backend_server.QUANT_HOLDOUT_DIR)
+    parser.add_argument("--tolerance", type=float, default=backend_server.QUANT_MAX_ACCURACY_DROP)
+    args = parser.parse_args()
+
+    backend_server.QUANT_CALIBRATION_DIR = args.calibration
+    holdout_paths = backend_server.list_scan_files(args.holdout)
+    if not holdout_paths:
+        print(f"No held-out images found in '{args.holdout}'")
+        sys.exit(1)
+
+    weights_hash = backend_server.file_sha256(args.weights)[:12]
+    reference = backend_server.PyTorchBackend(args.weights, weights_hash)
+    reference.load()
+    candidate = backend_server.OnnxInt8Backend(args.weights, weights_hash)
+    candidate.load_unchecked()
+
+    report = backend_server.compare_backends(reference, candidate, holdout_paths)
+    report.update(tolerance=args.tolerance, passed=report["accuracyDrop"] <= args.tolerance)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
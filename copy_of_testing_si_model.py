@@ -104,12 +104,38 @@ print("Setup complete!")
 
 
 # =================================
-def read_dicom_image(file_path):
+# DICOM display windows as (width, level) in Hounsfield units
+DICOM_WINDOW_PRESETS = {
+    'lung': (1500, -600),
+    'mediastinal': (350, 50),
+}
+
+# Lookup tables keyed by pixel dtype, rescale parameters and window
+_window_luts = {}
+
+
+def window_lut(dtype, slope, intercept, width, level):
+    """
+    Build (or reuse) a uint8 lookup table mapping every stored pixel value
+    through the rescale slope/intercept and a width/level window
+    """
+    key = (np.dtype(dtype).str, slope, intercept, width, level)
+    if key not in _window_luts:
+        index_dtype = np.uint8 if np.dtype(dtype).itemsize == 1 else np.uint16
+        values = np.arange(np.iinfo(index_dtype).max + 1, dtype=index_dtype).view(dtype).astype(np.float64)
+        lut = (values * slope + intercept - (level - width / 2)) / width * 255
+        _window_luts[key] = np.rint(np.clip(lut, 0, 255)).astype(np.uint8)
+    return _window_luts[key]
+
+
+def read_dicom_image(file_path, window=None):
     """
     Read a DICOM image and convert to a format suitable for processing
 
     Args:
         file_path: Path to the DICOM file
+        window: None for min-max normalization, a DICOM_WINDOW_PRESETS name
+            ('lung', 'mediastinal') or a custom (width, level) tuple
 
     Returns:
         Image in RGB format
@@ -121,8 +147,25 @@ def read_dicom_image(file_path):
             ds = pydicom.dcmread(file_path)
             img = ds.pixel_array
 
-            # Normalize to 8-bit range (0-255)
-            img = ((img - img.min()) / (img.max() - img.min()) * 255).astype(np.uint8)
+            if window is not None and ds.get('SamplesPerPixel', 1) == 1:
+                # Window in Hounsfield units, as the backend's apply_dicom_window does
+                width, level = DICOM_WINDOW_PRESETS.get(window, window)
+                slope = float(ds.get('RescaleSlope', 1) or 1)
+                intercept = float(ds.get('RescaleIntercept', 0) or 0)
+                if img.dtype in (np.uint8, np.int8, np.uint16, np.int16):
+                    # One lookup-table gather
+                    lut = window_lut(img.dtype, slope, intercept, width, level)
+                    img = lut[img.view(np.uint8 if img.dtype.itemsize == 1 else np.uint16)]
+                else:
+                    # 32-bit or float pixel data: the same window in float math
+                    img = img.astype(np.float32)
+                    img *= np.float32(slope * 255.0 / width)
+                    img += np.float32((intercept - (level - width / 2)) * 255.0 / width)
+                    np.clip(img, 0, 255, out=img)
+                    img = np.rint(img, out=img).astype(np.uint8)
+            else:
+                # Normalize to 8-bit range (0-255)
+                img = ((img - img.min()) / (img.max() - img.min()) * 255).astype(np.uint8)
 
             # Convert to RGB (DICOM images are often grayscale)
             img_rgb = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
@@ -389,7 +432,7 @@ def upload_test_image():
     print(f"Image saved to {image_path}")
     return image_path
 
-def run_prediction(model, image_path, conf_threshold=0.25):
+def run_prediction(model, image_path, conf_threshold=0.25, window=None):
     """
     Run prediction with edge detection and contour analysis
 
@@ -397,6 +440,7 @@ def run_prediction(model, image_path, conf_threshold=0.25):
         model: YOLO model
         image_path: Path to the image file
         conf_threshold: Confidence threshold for detection
+        window: DICOM window passed to read_dicom_image
 
     Returns:
         Results, image, edge map, contour features
@@ -406,7 +450,7 @@ def run_prediction(model, image_path, conf_threshold=0.25):
         start_time = time.time()
 
         # Read the image
-        image = read_dicom_image(image_path)
+        image = read_dicom_image(image_path, window)
         if image is None:
             return None, None, None, None
 
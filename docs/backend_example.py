@@ -87,6 +87,7 @@ def process_image(image_bytes: bytes) -> dict:
 
     # SIMULATION: Generate mock detection results
     # Remove this in production and use actual model results
+    # (for benchmarks, run backend_server.py with INFERENCE_BACKEND=stub instead)
     import random
     detected = random.choice([True, False])
     confidence = random.uniform(0.6, 0.95) if detected else random.uniform(0.1, 0.3)
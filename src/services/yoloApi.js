@@ -148,8 +148,9 @@ export const getPatientScans = async (patientId) => {
 
 /**
  * Process batch of CT scan slices
+ * Results are streamed back as NDJSON so progress is reported per analyzed slice
  * @param {Array<File>} files - Array of CT scan slice files
- * @param {Function} onProgress - Progress callback
+ * @param {Function} onProgress - Progress callback (0-100, slice event with running overallAssessment)
  * @returns {Promise<Object>} - Batch analysis results
  */
 export const uploadBatchScans = async (files, onProgress) => {
@@ -163,7 +164,7 @@ export const uploadBatchScans = async (files, onProgress) => {
     formData.append('timestamp', new Date().toISOString());
     formData.append('batch', 'true');
 
-    const response = await fetch(`${API_BASE_URL}/api/v1/scan/batch-analyze`, {
+    const response = await fetch(`${API_BASE_URL}/api/v1/scan/batch-analyze?stream=ndjson`, {
       method: 'POST',
       body: formData,
     });
@@ -173,13 +174,89 @@ export const uploadBatchScans = async (files, onProgress) => {
       throw new Error(error.message || 'Failed to analyze batch');
     }
 
-    return await response.json();
+    // Fall back to a buffered JSON body if the server does not stream
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!response.body || !contentType.includes('application/x-ndjson')) {
+      return await response.json();
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let batchResult = null;
+
+    const handleLine = (line) => {
+      if (!line.trim()) {
+        return;
+      }
+
+      const { type, ...event } = JSON.parse(line);
+      if (type === 'slice') {
+        if (onProgress) {
+          onProgress(Math.round((event.completedScans / event.totalScans) * 100), event);
+        }
+      } else if (type === 'complete') {
+        batchResult = event;
+      }
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+
+    if (!batchResult) {
+      throw new Error('Batch analysis ended before all slices were processed');
+    }
+
+    return batchResult;
   } catch (error) {
     console.error('Error uploading batch scans:', error);
     throw error;
   }
 };
 
+/**
+ * Analyze a whole DICOM series (slice files, zip archives or multi-frame objects) in one request
+ * @param {Array<File>} files - DICOM slices, zip archives of a series, or multi-frame DICOMs
+ * @param {string} window - Optional DICOM window preset (minmax, lung, mediastinal)
+ * @returns {Promise<Object>} - Per-slice detections and a volume summary
+ */
+export const uploadDicomVolume = async (files, window) => {
+  try {
+    const formData = new FormData();
+    files.forEach((file) => {
+      formData.append('scans', file);
+    });
+    if (window) {
+      formData.append('window', window);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/api/v1/scan/volume-analyze`, {
+      method: 'POST',
+      body: formData,
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Failed to analyze volume');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error uploading volume:', error);
+    throw error;
+  }
+};
+
 /**
  * Get detection confidence threshold recommendations
  * @returns {Promise<Object>} - Threshold configuration
@@ -233,6 +310,7 @@ export default {
   getScanResult,
   getPatientScans,
   uploadBatchScans,
+  uploadDicomVolume,
   getDetectionThresholds,
   checkApiHealth,
 };
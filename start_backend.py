@@ -9,15 +9,57 @@ This script:
 
 Usage:
     python start_backend.py
+    python start_backend.py --workers 4      # Pre-fork 4 workers sharing one loaded model
+    python start_backend.py --workers auto   # Size workers from CPU cores and memory
+    python start_backend.py --export-only    # Build the INFERENCE_BACKEND export and exit
 """
 
+import argparse
+import gc
 import os
+import signal
+import socket
 import sys
 import subprocess
+import time
+
+# Multi-worker mode (--workers or WEB_WORKERS): "1" runs a single uvicorn
+# process; N or "auto" loads the model once and forks N workers from it
+WEB_WORKERS = os.environ.get("WEB_WORKERS", "1")
+THREADS_PER_WORKER = int(os.environ.get("THREADS_PER_WORKER", 2))  # Used by "auto"
+WORKER_MEMORY_MB = int(os.environ.get("WORKER_MEMORY_MB", 1024))  # Private memory per worker
+
+# Workers that exit within WORKER_MIN_UPTIME seconds count as failed starts;
+# replacements back off exponentially and the server gives up after
+# WORKER_MAX_FAST_FAILURES failed starts in a row
+WORKER_MIN_UPTIME = float(os.environ.get("WORKER_MIN_UPTIME", 10))
+WORKER_MAX_FAST_FAILURES = int(os.environ.get("WORKER_MAX_FAST_FAILURES", 5))
+WORKER_RESPAWN_BASE_DELAY = 0.5  # Seconds, doubled per failed start in a row
+
+# The "stub" backend fakes the model for benchmarks and runs without best.pt
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "pytorch").lower()
+
+# ACTIVE_MODEL loads <version>.pt from the registry instead of best.pt
+ACTIVE_MODEL = os.environ.get("ACTIVE_MODEL")
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "models")
 
 
 def check_model_file():
-    """Check if best.pt model file exists"""
+    """Check if best.pt (or the ACTIVE_MODEL registry version) exists"""
+    if INFERENCE_BACKEND == "stub":
+        print("✓ Stub inference backend selected, best.pt not needed (detections are fake)")
+        return True
+    if ACTIVE_MODEL:
+        path = os.path.join(MODEL_REGISTRY_DIR, f"{ACTIVE_MODEL}.pt")
+        if not os.path.isfile(path):
+            print("=" * 70)
+            print(f"ERROR: ACTIVE_MODEL '{ACTIVE_MODEL}' not found in the model registry!")
+            print("=" * 70)
+            print(f"\nExpected location: {path}")
+            return False
+        file_size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"✓ Found registry model {ACTIVE_MODEL} ({file_size_mb:.2f} MB)")
+        return True
     if not os.path.exists("best.pt"):
         print("=" * 70)
         print("ERROR: best.pt model file not found!")
@@ -79,14 +121,86 @@ def check_dependencies():
         return True
 
 
-def start_server():
-    """Start the FastAPI server"""
-    # Get port from environment variable (Railway) or default to 8000
-    port = int(os.environ.get("PORT", 8000))
+def export_model():
+    """Export best.pt for INFERENCE_BACKEND (onnx/openvino) into the export cache"""
+    import backend_server
+
+    try:
+        artifact = backend_server.export_model_artifact()
+    except Exception as e:
+        print(f"\nError exporting model: {e}")
+        return False
+
+    if artifact is None:
+        print(f"✓ {backend_server.INFERENCE_BACKEND} backend needs no export")
+    else:
+        print(f"✓ Exported model for {backend_server.INFERENCE_BACKEND} backend: {artifact}")
+    return True
+
+
+def available_cpus():
+    """CPU cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory_mb():
+    """Memory available to this container (cgroup limit or MemAvailable), or None"""
+    candidates = []
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value.isdigit() and int(value) < 1 << 60:
+                candidates.append(int(value) // (1024 * 1024))
+        except OSError:
+            pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    candidates.append(int(line.split()[1]) // 1024)
+    except OSError:
+        pass
+    return min(candidates) if candidates else None
+
+
+def worker_setting(value):
+    """argparse type for --workers: a positive integer or auto"""
+    if value == "auto" or (value.isdigit() and int(value) >= 1):
+        return value
+    raise argparse.ArgumentTypeError(f'expected a positive integer or "auto", got {value!r}')
+
+
+def resolve_workers(setting):
+    """
+    Number of workers and PyTorch intra-op threads per worker
+
+    "auto" runs one worker per THREADS_PER_WORKER cores, capped by how many
+    WORKER_MEMORY_MB workers fit in available memory. Cores are split evenly
+    between workers so their thread pools do not oversubscribe the CPU.
+    """
+    cpus = available_cpus()
+    if setting == "auto":
+        workers = max(1, cpus // THREADS_PER_WORKER)
+        memory_mb = available_memory_mb()
+        if memory_mb is not None:
+            workers = max(1, min(workers, memory_mb // WORKER_MEMORY_MB))
+    else:
+        workers = max(1, int(setting))
+    return workers, max(1, cpus // workers)
+
+
+def print_banner(port, workers=1):
+    """Print the server URLs"""
 
     print("\n" + "=" * 70)
     print("Starting LungEvity YOLOv12 Backend Server")
     print("=" * 70)
+    if workers > 1:
+        print(f"\nWorkers: {workers} (pre-forked, sharing one loaded model)")
     print(f"\nServer will be available at:")
     print(f"  - Local:   http://localhost:{port}")
     print(f"  - Network: http://0.0.0.0:{port}")
@@ -95,9 +209,18 @@ def start_server():
     print(f"  - ReDoc:      http://localhost:{port}/redoc")
     print("\nHealth Check:")
     print(f"  - http://localhost:{port}/health")
+    print(f"  - Liveness:  http://localhost:{port}/health/live")
+    print(f"  - Readiness: http://localhost:{port}/health/ready (after model warm-up)")
     print("\nPress CTRL+C to stop the server")
     print("=" * 70 + "\n")
 
+
+def start_server():
+    """Start the FastAPI server"""
+    # Get port from environment variable (Railway) or default to 8000
+    port = int(os.environ.get("PORT", 8000))
+    print_banner(port)
+
     try:
         # Start uvicorn server
         # Remove --reload for production deployment
@@ -116,8 +239,120 @@ def start_server():
     return True
 
 
+def run_worker(sock, threads):
+    """Serve requests in a forked worker on the inherited listening socket"""
+    import torch
+    import uvicorn
+    import backend_server
+
+    torch.set_num_threads(threads)
+    config = uvicorn.Config(backend_server.app, host="0.0.0.0", port=sock.getsockname()[1])
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def start_prefork_server(workers, threads):
+    """
+    Load the model once, then fork workers that share its weights copy-on-write
+
+    The parent loads and warms up the model with a single intra-op thread (so
+    no OpenMP pool exists across fork), freezes the GC so collections do not
+    touch the inherited objects, binds the listening socket and forks the
+    workers. Each worker runs `threads` intra-op threads. Workers that die are
+    replaced, with a growing delay while they keep dying on startup; after
+    WORKER_MAX_FAST_FAILURES such failures in a row the server stops.
+    SIGTERM/SIGINT stop them all.
+    """
+    port = int(os.environ.get("PORT", 8000))
+
+    # Must be set before backend_server creates its thread pools
+    os.environ.setdefault("INFERENCE_WORKERS", str(threads))
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+    import torch
+    torch.set_num_threads(1)
+    import backend_server
+    backend_server.WORKER_PROCESSES = workers
+
+    print(f"Loading model once for {workers} workers ({threads} threads each)...")
+    if not backend_server.load_model():
+        return False
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    print_banner(port, workers)
+
+    children = {}  # pid -> start time (monotonic)
+    stopping = False
+    fast_failures = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(sock, threads)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+
+        fast_failures = fast_failures + 1 if time.monotonic() - started < WORKER_MIN_UPTIME else 0
+        if fast_failures >= WORKER_MAX_FAST_FAILURES:
+            print(f"Worker {pid} exited with status {status}; {fast_failures} workers in a row "
+                  f"failed within {WORKER_MIN_UPTIME:g}s of starting, stopping the server")
+            stop(None, None)
+            continue
+
+        delay = WORKER_RESPAWN_BASE_DELAY * 2 ** (fast_failures - 1) if fast_failures else 0
+        print(f"Worker {pid} exited with status {status}, starting a replacement"
+              + (f" in {delay:g}s" if delay else ""))
+        time.sleep(delay)
+        if not stopping:
+            spawn()
+
+    print("\n\nServer stopped")
+    return fast_failures < WORKER_MAX_FAST_FAILURES
+
+
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Start the YOLOv12 Lung Cancer Detection backend")
+    parser.add_argument("--workers", type=worker_setting, default=WEB_WORKERS,
+                        help='Worker processes: N or "auto" (default: WEB_WORKERS or 1)')
+    parser.add_argument("--export-only", action="store_true",
+                        help="Build the INFERENCE_BACKEND export and exit")
+    args = parser.parse_args()
+
     print("\n" + "=" * 70)
     print("YOLOv12 Lung Cancer Detection Backend - Startup")
     print("=" * 70 + "\n")
@@ -133,8 +368,17 @@ def main():
 
     print("\n✓ All checks passed!\n")
 
+    if args.export_only:
+        sys.exit(0 if export_model() else 1)
+
+    workers, threads = resolve_workers(args.workers)
+
     # Start the server
-    start_server()
+    if workers > 1 and hasattr(os, "fork"):
+        if not start_prefork_server(workers, threads):
+            sys.exit(1)
+    else:
+        start_server()
 
 
 if __name__ == "__main__":
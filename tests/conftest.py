@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture(scope="session")
+def backend_server():
+    """The server module; tests skip when its dependencies are not installed"""
+    return pytest.importorskip("backend_server")
@@ -0,0 +1,80 @@
+"""Building the API detection structure from per-box arrays"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+NAMES = {0: "adenocarcinoma", 1: "squamous_cell_carcinoma", 2: "normal"}
+
+
+def arrays(boxes, confidences, class_ids):
+    return (np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            np.array(confidences, dtype=np.float32),
+            np.array(class_ids, dtype=np.int64))
+
+
+def test_no_detections_is_normal(backend_server):
+    result = backend_server.detections_from_arrays(*arrays([], [], []), NAMES, 640, 480)
+    assert result == {
+        "detected": False,
+        "confidence": 0.5,
+        "topClass": "normal",
+        "detections": [],
+        "imageSize": {"width": 640, "height": 480}
+    }
+
+
+def test_detection_fields(backend_server):
+    result = backend_server.detections_from_arrays(
+        *arrays([[10.7, 20.2, 50.9, 60.4]], [0.87654], [1]), NAMES, 512, 512
+    )
+    assert result["detected"] is True
+    assert result["topClass"] == "squamous_cell_carcinoma"
+    assert result["confidence"] == pytest.approx(0.87654)
+    assert result["detections"] == [{
+        "class": "squamous_cell_carcinoma",
+        "confidence": 0.877,
+        "boundingBox": {"x": 10, "y": 20, "width": 40, "height": 40},
+        "characteristics": {"size_mm": 20.1, "shape": "round", "density": "solid"}
+    }]
+
+
+def test_values_are_plain_python_types(backend_server):
+    result = backend_server.detections_from_arrays(*arrays([[0, 0, 10, 10]], [0.5], [0]), NAMES, 64, 64)
+    detection = result["detections"][0]
+    assert type(result["confidence"]) is float
+    assert type(detection["confidence"]) is float
+    assert all(type(value) is int for value in detection["boundingBox"].values())
+    assert type(detection["characteristics"]["size_mm"]) is float
+
+
+@pytest.mark.parametrize("box, shape", [
+    ([0, 0, 10, 10], "round"),
+    ([0, 0, 12, 10], "round"),  # Aspect ratio 1.2 is still round
+    ([0, 0, 13, 10], "oval"),
+    ([0, 0, 7, 10], "irregular"),
+    ([0, 0, 10, 0], "round"),  # Zero height: aspect ratio treated as 1
+])
+def test_shape_from_aspect_ratio(backend_server, box, shape):
+    result = backend_server.detections_from_arrays(*arrays([box], [0.5], [0]), NAMES, 64, 64)
+    assert result["detections"][0]["characteristics"]["shape"] == shape
+
+
+def test_top_class_is_first_highest_confidence(backend_server):
+    result = backend_server.detections_from_arrays(
+        *arrays([[0, 0, 10, 10]] * 3, [0.4, 0.9, 0.9], [0, 1, 0]), NAMES, 64, 64
+    )
+    assert result["topClass"] == "squamous_cell_carcinoma"
+    assert result["confidence"] == pytest.approx(0.9)
+    assert [d["class"] for d in result["detections"]] == [
+        "adenocarcinoma", "squamous_cell_carcinoma", "adenocarcinoma"
+    ]
+
+
+def test_normal_top_class_is_not_detected(backend_server):
+    result = backend_server.detections_from_arrays(
+        *arrays([[0, 0, 10, 10], [0, 0, 5, 5]], [0.8, 0.3], [2, 0]), NAMES, 64, 64
+    )
+    assert result["topClass"] == "normal"
+    assert result["detected"] is False
+    assert len(result["detections"]) == 2
@@ -0,0 +1,131 @@
+"""ETag, Range and If-Range handling of the image endpoints"""
+
+import pytest
+
+CONTENT = bytes(range(100))
+ETAG = '"0123456789abcdef"'
+
+
+def make_request(backend_server, **headers):
+    return backend_server.Request({
+        "type": "http",
+        "method": "GET",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    ("*", True),
+    ('"other"', False),
+    (ETAG.strip('"'), False),
+])
+def test_etag_matches(backend_server, header, expected):
+    assert backend_server.etag_matches(header, ETAG) is expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-1000", (0, 99)),
+    ("bytes=90-1000", (90, 99)),
+    ("bytes=99-99", (99, 99)),
+    ("BYTES = 5-6", (5, 6)),
+])
+def test_parse_byte_range(backend_server, header, expected):
+    assert backend_server.parse_byte_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-9",  # Other units
+    "bytes=0-9,20-29",  # Multiple ranges
+    "bytes=-",
+    "bytes=5",
+    "bytes=a-9",
+    "bytes=0-b",
+    "bytes=-5-6",
+])
+def test_parse_byte_range_ignores_unsupported_headers(backend_server, header):
+    assert backend_server.parse_byte_range(header, len(CONTENT)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=100-200", "bytes=20-10", "bytes=-0"])
+def test_parse_byte_range_rejects_unsatisfiable_ranges(backend_server, header):
+    with pytest.raises(ValueError):
+        backend_server.parse_byte_range(header, len(CONTENT))
+
+
+def test_parse_byte_range_on_empty_content(backend_server):
+    with pytest.raises(ValueError):
+        backend_server.parse_byte_range("bytes=0-", 0)
+
+
+def test_full_response(backend_server):
+    response = backend_server.image_bytes_response(make_request(backend_server), CONTENT, "image/png", ETAG)
+    assert response.status_code == 200
+    assert response.body == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == backend_server.IMAGE_CACHE_CONTROL
+    assert "content-range" not in response.headers
+
+
+def test_partial_response(backend_server):
+    request = make_request(backend_server, range="bytes=10-19")
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 206
+    assert response.body == CONTENT[10:20]
+    assert response.headers["content-range"] == "bytes 10-19/100"
+    assert response.headers["content-length"] == "10"
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_suffix_range_response(backend_server):
+    request = make_request(backend_server, range="bytes=-5")
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 206
+    assert response.body == CONTENT[-5:]
+    assert response.headers["content-range"] == "bytes 95-99/100"
+
+
+def test_unsatisfiable_range_response(backend_server):
+    request = make_request(backend_server, range="bytes=100-")
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 416
+    assert response.body == b""
+    assert response.headers["content-range"] == "bytes */100"
+
+
+def test_ignored_range_serves_full_body(backend_server):
+    request = make_request(backend_server, range="bytes=0-9,20-29")
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 200
+    assert response.body == CONTENT
+
+
+def test_if_range_matching_etag_serves_range(backend_server):
+    request = make_request(backend_server, range="bytes=0-9", if_range=ETAG)
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 206
+    assert response.body == CONTENT[:10]
+
+
+@pytest.mark.parametrize("if_range", ['"stale"', f"W/{ETAG}", "Wed, 21 Oct 2015 07:28:00 GMT"])
+def test_if_range_mismatch_serves_full_body(backend_server, if_range):
+    # Weak tags and dates never match a strong ETag for If-Range
+    request = make_request(backend_server, range="bytes=0-9", if_range=if_range)
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 200
+    assert response.body == CONTENT
+
+
+def test_if_range_mismatch_skips_unsatisfiable_range(backend_server):
+    request = make_request(backend_server, range="bytes=100-", if_range='"stale"')
+    response = backend_server.image_bytes_response(request, CONTENT, "image/png", ETAG)
+    assert response.status_code == 200
+    assert response.body == CONTENT
@@ -0,0 +1,119 @@
+"""Inference result cache: keys, LRU memory budget and the disk tier"""
+
+import json
+
+RESULT = {"detected": True, "confidence": 0.91, "topClass": "adenocarcinoma", "detections": []}
+
+
+def entry_size(result: dict) -> int:
+    return len(json.dumps(result))
+
+
+def test_miss_then_hit(backend_server):
+    cache = backend_server.ResultCache(1024 * 1024)
+    assert cache.get("key") is None
+    cache.put("key", RESULT)
+    assert cache.get("key") == RESULT
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hitRate"] == 0.5
+    assert stats["bytes"] == entry_size(RESULT)
+    assert stats["diskTier"] is False
+
+
+def test_put_replaces_entry(backend_server):
+    cache = backend_server.ResultCache(1024 * 1024)
+    cache.put("key", RESULT)
+    updated = dict(RESULT, confidence=0.5)
+    cache.put("key", updated)
+    assert cache.get("key") == updated
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == entry_size(updated)
+
+
+def test_evicts_least_recently_used(backend_server):
+    results = {key: dict(RESULT, key=key) for key in "abc"}
+    cache = backend_server.ResultCache(2 * entry_size(results["a"]))
+    cache.put("a", results["a"])
+    cache.put("b", results["b"])
+    assert cache.get("a") == results["a"]  # "b" is now the oldest
+    cache.put("c", results["c"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == results["a"]
+    assert cache.get("c") == results["c"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_oversized_result_is_not_kept(backend_server):
+    cache = backend_server.ResultCache(entry_size(RESULT) - 1)
+    cache.put("key", RESULT)
+    assert cache.get("key") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_disk_tier_survives_restart(backend_server, tmp_path):
+    backend_server.ResultCache(1024 * 1024, str(tmp_path)).put("key", RESULT)
+
+    restarted = backend_server.ResultCache(1024 * 1024, str(tmp_path))
+    assert restarted.get("key") == RESULT
+    assert restarted.get("key") == RESULT  # Promoted to memory
+    stats = restarted.stats()
+    assert (stats["hits"], stats["diskHits"], stats["entries"]) == (2, 1, 1)
+
+
+def test_disk_tier_serves_evicted_results(backend_server, tmp_path):
+    cache = backend_server.ResultCache(entry_size(RESULT), str(tmp_path))
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    assert cache.get("a") == RESULT
+    assert cache.stats()["diskHits"] == 1
+
+
+def test_corrupt_disk_entry_is_a_miss(backend_server, tmp_path):
+    cache = backend_server.ResultCache(1024 * 1024, str(tmp_path))
+    with open(cache._disk_path("key"), "w") as f:
+        f.write("{truncated")
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_key_covers_inference_parameters(backend_server):
+    make_key = backend_server.ResultCache.make_key
+    key = make_key("sha", "lung", "v1", "pytorch")
+    assert key == make_key("sha", "lung", "v1", "pytorch")
+    assert len({
+        key,
+        make_key("other", "lung", "v1", "pytorch"),
+        make_key("sha", "minmax", "v1", "pytorch"),
+        make_key("sha", "lung", "v2", "pytorch"),
+        make_key("sha", "lung", "v1", "onnx"),
+    }) == 5
+    assert f"conf={backend_server.CONF_THRESHOLD}" in key
+
+
+def test_disk_tier_deletes_oldest_files_over_budget(backend_server, tmp_path):
+    results = {key: dict(RESULT, key=key) for key in "abc"}
+    cache = backend_server.ResultCache(1, str(tmp_path), max_disk_bytes=2 * entry_size(results["a"]))
+    for key in "abc":
+        cache.put(key, results[key])
+
+    assert cache.get("a") is None
+    assert cache.get("b") == results["b"]
+    assert cache.get("c") == results["c"]
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    stats = cache.stats()
+    assert (stats["diskEntries"], stats["diskEvictions"]) == (2, 1)
+    assert stats["diskBytes"] <= stats["maxDiskBytes"]
+
+
+def test_disk_budget_counts_files_from_earlier_runs(backend_server, tmp_path):
+    cache = backend_server.ResultCache(1024 * 1024, str(tmp_path))
+    for key in "abc":
+        cache.put(key, dict(RESULT, key=key))
+
+    restarted = backend_server.ResultCache(1024 * 1024, str(tmp_path), max_disk_bytes=entry_size(RESULT) * 2)
+    assert restarted.stats()["diskEntries"] <= 2
+    assert len(list(tmp_path.glob("*.json"))) == restarted.stats()["diskEntries"]
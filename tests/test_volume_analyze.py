@@ -0,0 +1,46 @@
+"""Whole-volume uploads to /api/v1/scan/volume-analyze"""
+
+import gzip
+
+import pytest
+
+np = pytest.importorskip("numpy")
+nib = pytest.importorskip("nibabel")
+pytest.importorskip("httpx")  # Needed by the FastAPI TestClient
+
+SLICES = 5
+
+
+@pytest.fixture
+def client(backend_server, monkeypatch):
+    """Test client serving the deterministic stub model (startup is not run)"""
+    from fastapi.testclient import TestClient
+
+    backend = backend_server.StubBackend("stub", backend_server.StubBackend.version())
+    backend.load()
+    monkeypatch.setattr(backend_server, "STUB_COMPUTE_MS", 0)
+    monkeypatch.setattr(backend_server, "model", backend)
+    monkeypatch.setattr(backend_server, "MODEL_LOADED", True)
+    return TestClient(backend_server.app)
+
+
+def nifti_bytes() -> bytes:
+    data = np.arange(32 * 32 * SLICES, dtype=np.int16).reshape(32, 32, SLICES) - 1000
+    return nib.Nifti1Image(data, np.diag([0.7, 0.7, 2.5, 1.0])).to_bytes()
+
+
+@pytest.mark.parametrize("filename, encode", [
+    ("volume.nii", lambda data: data),
+    ("volume.nii.gz", gzip.compress),
+])
+def test_multi_slice_nifti(client, filename, encode):
+    response = client.post(
+        "/api/v1/scan/volume-analyze",
+        files={"scans": (filename, encode(nifti_bytes()), "application/octet-stream")}
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["sortedBy"] == "position"
+    assert [entry["sliceNumber"] for entry in body["slices"]] == list(range(1, SLICES + 1))
+    assert all("error" not in entry for entry in body["slices"])
+    assert body["summary"]["analyzedSlices"] == SLICES